@@ -10,7 +10,26 @@ def hydra_output_callback(pipeline, visualizer):
     if visualizer:
         visualizer.update_graph(pipeline.graph)
 
-def _take_step(pipeline, data, pose, labels, image_viz, is_eqa=False, segmenter=None):
+class FrameContext:
+    """Everything derived from the observation at one pose, computed once and shared by Hydra, the TSDF and logging."""
+    def __init__(self, data, pose, is_eqa=False, segmenter=None):
+        self.timestamp = pose[0]
+        self.rgb = data.rgb
+        self.depth = data.depth
+        if self.rgb is not None:
+            self.labels = segmenter(self.rgb) if segmenter else data.labels
+        else:
+            self.labels = np.zeros((640, 480)).astype(int)
+
+        # Camera pose in the TSDF convention, and as position + wxyz quaternion for Hydra and rerun
+        self.cam_pose_tsdf = get_cam_pose_tsdf(data.get_depth_sensor_state())
+        self.camera_pos = self.cam_pose_tsdf[:3, 3]
+        self.camera_quat_wxyz = np.roll(R.from_matrix(self.cam_pose_tsdf[:3, :3]).as_quat(), 1)
+
+        self.agent_pos, self.agent_quat_wxyz = data.get_state(is_eqa=is_eqa)
+        self.pts_normal = pos_habitat_to_normal(pose[1])
+
+def _take_step(pipeline, data, pose, is_eqa=False, segmenter=None):
     timestamp, world_t_body, q_wxyz = pose
     q_xyzw = np.roll(q_wxyz, -1) #changing to xyzw format
 
@@ -19,17 +38,12 @@ def _take_step(pipeline, data, pose, labels, image_viz, is_eqa=False, segmenter=
     world_T_body[:3, :3] = R.from_quat(q_xyzw).as_matrix()
     data.set_pose(timestamp, world_T_body, is_eqa=is_eqa)
 
-
-    if data.rgb is not None:
-        labels = segmenter(data.rgb) if segmenter else data.labels
-
+    frame = FrameContext(data, pose, is_eqa=is_eqa, segmenter=segmenter)
     if is_eqa:
-        pose_cam = get_cam_pose_tsdf(data.get_depth_sensor_state())
-        world_t_body = pose_cam[:3, 3]
-        q_xyzw = R.from_matrix(pose_cam[:3, :3]).as_quat()
-        q_wxyz = np.roll(q_xyzw, 1)
+        world_t_body, q_wxyz = frame.camera_pos, frame.camera_quat_wxyz
 
-    pipeline.step(timestamp, world_t_body, q_wxyz, data.depth, labels, data.rgb)
+    pipeline.step(timestamp, world_t_body, q_wxyz, frame.depth, frame.labels, frame.rgb)
+    return frame
 
 def run(
     pipeline,
@@ -41,55 +55,67 @@ def run(
     rr_logger=None,
     sg_sim=None,
     tsdf_planner=None,
-    save_image=False
+    save_image=False,
+    mesh_stream=None,
+    graph_saver=None,
 ):
 
     agent_positions, agent_quats_wxyz = [], []
     imgs_rgb, imgs_depth, extrinsics = [], [], []
 
     for pose in tqdm(pose_source, desc='Executing traj'):
-        pipeline.graph.save(output_path / "dsg.json", False)
-        pipeline.graph.save_filtered(output_path / "filtered_dsg.json", False)
-        
-        if habitat_data.rgb is not None:
-            labels = segmenter(habitat_data.rgb) if segmenter else habitat_data.labels
-        else:
-            labels = np.zeros((640, 480)).astype(int)
-            
-        _take_step(pipeline, habitat_data, pose, labels, image_viz=None, is_eqa=True, segmenter=segmenter)
-        imgs_rgb.append(habitat_data.rgb)
-        imgs_depth.append(habitat_data.depth)
+        if graph_saver is not None:
+            graph_saver.on_pose(pipeline.graph)
+
+        # Segmentation, camera and agent poses are computed once per frame and shared below
+        frame = _take_step(pipeline, habitat_data, pose, is_eqa=True, segmenter=segmenter)
+        imgs_rgb.append(frame.rgb)
+        imgs_depth.append(frame.depth)
 
-        agent_pos, agent_quat_wxyz = habitat_data.get_state(is_eqa=True)
-        agent_positions.append(agent_pos)
-        agent_quats_wxyz.append(agent_quat_wxyz)
-        camera_pos, camera_quat_wxyz = habitat_data.get_camera_pos(is_eqa=True)
-        mesh_vertices, mesh_colors, mesh_triangles = hydra_get_mesh(pipeline)
+        agent_positions.append(frame.agent_pos)
+        agent_quats_wxyz.append(frame.agent_quat_wxyz)
 
-        cam_pose_tsdf = get_cam_pose_tsdf(habitat_data.get_depth_sensor_state())
-        extrinsics.append(cam_pose_tsdf)
-        pts_normal = pos_habitat_to_normal(pose[1])
+        extrinsics.append(frame.cam_pose_tsdf)
+        if sg_sim:
+            # Key frames are scored in the background while the trajectory executes
+            sg_sim.add_trajectory_frame(frame.rgb, frame.depth, frame.cam_pose_tsdf)
 
         if tsdf_planner:
             tsdf_planner.update(
-                habitat_data.rgb,
-                habitat_data.depth,
-                pts_normal,
-                cam_pose_tsdf,
+                frame.rgb,
+                frame.depth,
+                frame.pts_normal,
+                frame.cam_pose_tsdf,
             )
             frontier_nodes = tsdf_planner.frontier_to_sample_normal
             
         if rr_logger:
-            rr_logger.log_mesh_data(mesh_vertices, mesh_colors, mesh_triangles)
+            # The mesh copy is only made on frames the logger keeps
+            if rr_logger.enabled("world/mesh"):
+                if mesh_stream is None:
+                    rr_logger.log_mesh_data(*hydra_get_mesh(pipeline))
+                else:
+                    # Only chunks with new or changed geometry are logged
+                    rr_logger.log_mesh_chunks(*mesh_stream.update(pipeline.graph.mesh))
             rr_logger.log_agent_data(agent_positions)
-            rr_logger.log_agent_tf(agent_pos, agent_quat_wxyz)
-            rr_logger.log_camera_tf(camera_pos, camera_quat_wxyz)
-            rr_logger.log_img_data(habitat_data.rgb, labels)
+            rr_logger.log_agent_tf(frame.agent_pos, frame.agent_quat_wxyz)
+            rr_logger.log_camera_tf(frame.camera_pos, frame.camera_quat_wxyz)
+            rr_logger.log_img_data(frame.rgb, frame.labels)
             rr_logger.step()
 
         if step_callback:
             step_callback(pipeline, None)
 
+    if graph_saver is not None:
+        graph_saver.on_trajectory_end(pipeline.graph)
+
+    if rr_logger and mesh_stream is not None:
+        # In-place mesh edits are only caught by a full diff, done once per trajectory
+        if rr_logger.enabled("world/mesh"):
+            rr_logger.log_mesh_chunks(*mesh_stream.update(pipeline.graph.mesh, full=True))
+        else:
+            mesh_stream.request_full()
+
     if save_image:
         curr_img = Image.fromarray(habitat_data.rgb)
         curr_img.save(output_path / "current_img.png")
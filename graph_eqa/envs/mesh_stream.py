@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class HydraMeshStream:
+    """Tracks the Hydra mesh between calls and returns only the face chunks that changed.
+
+    Faces are split into fixed-size chunks, each logged as its own entity together with the
+    vertices it references, so appended geometry only dirties the last chunks. Vertex and face
+    counts are polled first and frames without new geometry never copy the mesh out of the
+    bindings. The bindings only expose whole-array getters, so a frame with new geometry copies
+    the arrays once and diffs them against the cached ones. In-place edits that keep the counts
+    unchanged are picked up by full refreshes (full=True or request_full).
+    """
+    def __init__(self, chunk_size=65536):
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        self._vertices = np.zeros((6, 0)) # xyz + rgb rows, as returned by the bindings
+        self._faces = np.zeros((3, 0), dtype=np.int64)
+        self._full_pending = False
+
+    @property
+    def num_chunks(self):
+        return int(np.ceil(self._faces.shape[1] / self.chunk_size))
+
+    def request_full(self):
+        """Diff the whole mesh on the next update, e.g. when the logger skipped the trajectory end."""
+        self._full_pending = True
+
+    def update(self, mesh, full=False):
+        """Changed chunks as (chunk index, vertices, colors, triangles) and the current number of chunks."""
+        full = full or self._full_pending
+        if not full and hasattr(mesh, 'num_vertices') and (mesh.num_vertices(), mesh.num_faces()) == (self._vertices.shape[1], self._faces.shape[1]):
+            return [], self.num_chunks
+        self._full_pending = False
+        vertices, faces = mesh.get_vertices(), mesh.get_faces()
+        dirty = self._dirty_chunks(vertices, faces)
+        self._vertices, self._faces = vertices, faces
+        return [self._chunk(k) for k in dirty], self.num_chunks
+
+    def _dirty_chunks(self, vertices, faces):
+        old_num_vertices, old_num_faces = self._vertices.shape[1], self._faces.shape[1]
+        num_chunks = int(np.ceil(faces.shape[1] / self.chunk_size))
+        if old_num_faces == 0 or vertices.shape[1] < old_num_vertices or faces.shape[1] < old_num_faces:
+            # Geometry was removed and indices shifted, every chunk is re-sent
+            return list(range(num_chunks))
+
+        changed_vertices = np.ones(vertices.shape[1], dtype=bool)
+        changed_vertices[:old_num_vertices] = np.any(vertices[:, :old_num_vertices] != self._vertices, axis=0)
+        # Existing faces are dirty if they were rewritten or reference a vertex that changed
+        old_faces = faces[:, :old_num_faces]
+        touched = np.any(old_faces != self._faces, axis=0) | changed_vertices[old_faces].any(axis=0)
+        dirty = set((np.flatnonzero(touched) // self.chunk_size).tolist())
+        # The chunk holding the first new face onwards
+        dirty.update(range(old_num_faces // self.chunk_size, num_chunks))
+        return sorted(dirty)
+
+    def _chunk(self, k):
+        triangles = self._faces[:, k*self.chunk_size:(k+1)*self.chunk_size]
+        idxs, inverse = np.unique(triangles, return_inverse=True)
+        vertices = self._vertices[:, idxs]
+        return k, vertices[:3].T, vertices[3:].T, inverse.reshape(triangles.shape).T
+
+    def full_mesh(self, mesh):
+        """Whole mesh on demand, in the layout of hydra_get_mesh."""
+        self.update(mesh, full=True)
+        return self._vertices[:3].T, self._vertices[3:].T, self._faces.T
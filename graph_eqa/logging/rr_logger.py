@@ -1,15 +1,109 @@
+import atexit, os, threading, zlib
+from collections import OrderedDict
+from itertools import count
 import rerun as rr
 import rerun.blueprint as rrb
 import numpy as np
 
+
+class LogWriter:
+    """Runs log calls on a background thread so visualization never blocks the perception loop.
+
+    Pending calls are keyed by entity path: a newer call for a path replaces the pending one
+    (the stale frame is dropped) and moves to the back of the queue, so the writer always
+    applies the latest state of every entity in submission order. When the queue is full the
+    oldest evictable call is discarded instead of blocking the caller. Deltas, whose sender
+    considers them delivered once submitted, are submitted as non-evictable.
+    """
+    def __init__(self, write_fn, queue_size=64):
+        self._write_fn = write_fn
+        self._queue_size = queue_size
+        self._pending = OrderedDict() # key -> (droppable, args)
+        self._seq = count()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self.num_dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, entity, args, coalesce=True, evictable=True):
+        with self._cond:
+            if self._closed:
+                return
+            key = entity if coalesce else (entity, next(self._seq))
+            if key in self._pending:
+                del self._pending[key]
+                self.num_dropped += 1
+            elif len(self._pending) >= self._queue_size:
+                oldest = next((k for k, (can_evict, _) in self._pending.items() if can_evict), None)
+                if oldest is not None:
+                    del self._pending[oldest]
+                    self.num_dropped += 1
+            self._pending[key] = (coalesce and evictable, args)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while len(self._pending) == 0 and not self._closed:
+                    self._cond.wait()
+                if len(self._pending) == 0:
+                    return
+                _, (_, args) = self._pending.popitem(last=False)
+                self._busy = True
+            try:
+                self._write_fn(*args)
+            except Exception as e:
+                print(f"rerun logging failed: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def flush(self):
+        with self._cond:
+            while len(self._pending) > 0 or self._busy:
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+def _downscale(img, max_size):
+    # Integer striding keeps label images exact and costs nothing compared to resampling
+    if max_size is None or max(img.shape[:2]) <= max_size:
+        return img
+    stride = int(np.ceil(max(img.shape[:2]) / max_size))
+    return img[::stride, ::stride]
+
+
 class RRLogger:
-    def __init__(self, output_path):
+    def __init__(self, output_path, cfg=None):
+        cfg = {} if cfg is None else cfg
+        self._writer = None
+        self._enabled = cfg.get('enabled', True)
+        if not self._enabled:
+            # Every log method becomes a no-op and no recording is created
+            for name in [name for name in dir(type(self)) if name.startswith('log_')] + ['step', 'reset']:
+                setattr(self, name, _noop)
+            return
+
         # Initialize Rerun and specify the .rrd file for logging
         full_output_path = output_path / "test_logger.rrd"
 
         self._timeline = "vlm_plan_logging"
         rr.init(self._timeline)
         rr.save(full_output_path)
+        # Log calls may run on the writer thread after the next episode's logger was created, so they target this recording explicitly
+        self._recording = rr.get_global_data_recording()
 
         self.primary_camera_entity = "world/camera"
 
@@ -65,6 +159,7 @@ class RRLogger:
         )
 
         rr.send_blueprint(blueprint)
+        self._blueprint = blueprint
 
         self._node_color_map = {
             'object': [225,225,0],
@@ -98,16 +193,120 @@ class RRLogger:
             'room-to-room': [0,0,0],
         }
 
+        # Logging budget: every Nth frame per entity (path prefix), capped RGB size, mesh only when it changed
+        self._decimation = dict(cfg.get('decimation', None) or {})
+        self._periods = {}
+        self._max_image_size = cfg.get('max_image_size', None)
+        self._jpeg_quality = cfg.get('jpeg_quality', 95)
+        self._mesh_only_on_change = cfg.get('mesh_only_on_change', True)
+        self._mesh_signature = None
+        # Latest payload of every streamed mesh chunk, replayed into a rotated recording
+        self._mesh_chunks = {}
+        self._num_mesh_chunks = 0
+
+        # Past the byte cap the recording rotates to a new file, the oldest files beyond max_recording_files are deleted
+        max_recording_mb = cfg.get('max_recording_mb', None)
+        self._max_recording_bytes = None if max_recording_mb is None else int(max_recording_mb * 2**20)
+        self._max_recording_files = max(1, cfg.get('max_recording_files', 1))
+        self._output_path = output_path
+        self._recording_files = [full_output_path]
+        self._num_rotations = 0
+
         self.reset()
 
+        # Payloads are built and written on a background thread, dropping stale frames when it falls behind
+        self._writer = None
+        if cfg.get('async_writer', True):
+            self._writer = LogWriter(self._write, queue_size=cfg.get('queue_size', 64))
+        # Unregistered in close(), so closed loggers (and their mesh caches) are not kept alive until exit
+        atexit.register(self.close)
+
+    def _write(self, t, log_fn, *args):
+        rr.set_time_seconds(self._timeline, t, recording=self._recording)
+        log_fn(*args)
+        if self._max_recording_bytes is not None and os.path.getsize(self._recording_files[-1]) > self._max_recording_bytes:
+            self._rotate_recording()
+
+    def _rotate_recording(self):
+        self._num_rotations += 1
+        path = self._output_path / f"test_logger_{self._num_rotations}.rrd"
+        rr.save(path, recording=self._recording)
+        rr.send_blueprint(self._blueprint, recording=self._recording)
+        self._recording_files.append(path)
+        # The new file needs the mesh again even if it did not change
+        self._mesh_signature = None
+        for entity, chunk in list(self._mesh_chunks.items()):
+            self._log_mesh_chunk(entity, *chunk)
+        while len(self._recording_files) > self._max_recording_files:
+            old_path = self._recording_files.pop(0)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+    def enabled(self, entity):
+        """Whether a log call for entity would be kept this frame, so callers can skip building expensive payloads."""
+        if not self._enabled:
+            return False
+        if entity not in self._periods:
+            prefixes = [prefix for prefix in self._decimation if entity.lstrip('/').startswith(prefix.lstrip('/'))]
+            self._periods[entity] = max(1, int(self._decimation[max(prefixes, key=len)])) if len(prefixes) > 0 else 1
+        return self._frame % self._periods[entity] == 0
+
+    def _submit(self, entity, log_fn, *args, coalesce=True, evictable=True):
+        """Run log_fn(*args) at the current time, on the writer thread if there is one.
+
+        Calls for the same entity are coalesced to the latest unless coalesce is False.
+        Coalesced calls are also subject to the entity's decimation. Non-evictable calls
+        are never dropped to make room in a full queue, only replaced by a newer call for
+        the same entity.
+        """
+        if coalesce and not self.enabled(entity):
+            return
+        if self._writer is None:
+            self._write(self._t, log_fn, *args)
+        else:
+            self._writer.submit(entity, (self._t, log_fn) + args, coalesce=coalesce, evictable=evictable)
+
+    def _log(self, entity, *archetypes, **kwargs):
+        rr.log(entity, *archetypes, recording=self._recording, **kwargs)
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        """Drain the writer, flush and disconnect the recording. The logger must not be used afterwards."""
+        atexit.unregister(self.close)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        recording = getattr(self, '_recording', None)
+        if recording is not None:
+            recording.flush(blocking=True)
+            rr.disconnect(recording=recording)
+            self._recording = None
+        self._mesh_chunks = {}
+
+    @property
+    def num_dropped(self):
+        return self._writer.num_dropped if self._writer is not None else 0
+
     def reset(self):
         self._t = 0
         self._dt = 0.1
+        self._frame = 0
+        # Also kept on the caller's thread for code that logs through rr directly
         rr.set_time_seconds(self._timeline, self._t)
 
     def log_mesh_data(self, mesh_vertices, mesh_colors, mesh_triangles):
-        
-        rr.log(
+        self._submit("world/mesh", self._log_mesh, mesh_vertices, mesh_colors, mesh_triangles)
+
+    def _log_mesh(self, mesh_vertices, mesh_colors, mesh_triangles):
+        if self._mesh_only_on_change:
+            signature = tuple((np.shape(a), zlib.crc32(np.ascontiguousarray(a))) for a in (mesh_vertices, mesh_colors, mesh_triangles))
+            if signature == self._mesh_signature:
+                return
+            self._mesh_signature = signature
+        self._log(
             "world/mesh",
             rr.Mesh3D(
                 vertex_positions=mesh_vertices,
@@ -117,12 +316,46 @@ class RRLogger:
             timeless=False,
         )
     
+    def log_mesh_chunks(self, chunks, num_chunks):
+        """Mesh deltas from HydraMeshStream: each changed chunk replaces its own entity, chunks past num_chunks are cleared.
+
+        The stream marks chunks clean once returned, so they are submitted as non-evictable.
+        """
+        for k, vertices, colors, triangles in chunks:
+            entity = f"world/mesh/chunk_{k}"
+            self._submit(entity, self._log_mesh_chunk, entity, vertices, colors, triangles, evictable=False)
+        for k in range(num_chunks, self._num_mesh_chunks):
+            entity = f"world/mesh/chunk_{k}"
+            self._submit(entity, self._clear_mesh_chunk, entity, evictable=False)
+        self._num_mesh_chunks = num_chunks
+
+    def _log_mesh_chunk(self, entity, vertices, colors, triangles):
+        self._mesh_chunks[entity] = (vertices, colors, triangles)
+        self._log(
+            entity,
+            rr.Mesh3D(
+                vertex_positions=vertices,
+                vertex_colors=colors,
+                triangle_indices=triangles,
+            ),
+            timeless=False,
+        )
+
+    def _clear_mesh_chunk(self, entity):
+        self._mesh_chunks.pop(entity, None)
+        self._clear(entity)
+
     def log_agent_data(self, agent_positions):
-        rr.log(f"world/robot_traj", rr.LineStrips3D(agent_positions, colors=[0, 0, 255]))
-        rr.log(f"world/robot_pos", rr.Points3D(agent_positions[-1], colors=[0, 0, 255], radii=0.11))
+        # Copied, the caller keeps appending to its trajectory
+        agent_positions = np.array(agent_positions)
+        self._submit("world/robot_traj", self._log_agent, agent_positions)
+
+    def _log_agent(self, agent_positions):
+        self._log(f"world/robot_traj", rr.LineStrips3D(agent_positions, colors=[0, 0, 255]))
+        self._log(f"world/robot_pos", rr.Points3D(agent_positions[-1], colors=[0, 0, 255], radii=0.11))
 
     def log_traj_data(self, agent_positions):
-        rr.log("world/desired_traj", rr.LineStrips3D(agent_positions, colors=[0, 255, 255]))
+        self._submit("world/desired_traj", self._log, "world/desired_traj", rr.LineStrips3D(agent_positions, colors=[0, 255, 255]))
     
     def log_agent_tf(self, pos, quat):
         translation = np.asarray([pos[0], pos[1], pos[2]])
@@ -130,7 +363,7 @@ class RRLogger:
         agent_from_world = rr.Transform3D(
             translation=translation, rotation=rr.Quaternion(xyzw=quat_mod), from_parent=False
         )
-        rr.log(f"world/agent_tf", agent_from_world)
+        self._submit("world/agent_tf", self._log, f"world/agent_tf", agent_from_world)
         
     def log_camera_tf(self, pos, quat, cam_entity=None):
         translation = np.asarray([pos[0], pos[1], pos[2]])
@@ -140,61 +373,78 @@ class RRLogger:
         )
         if cam_entity is None:
             cam_entity = self.primary_camera_entity
-        rr.log(f"{cam_entity}", camera_from_world)
+        self._submit(cam_entity, self._log, f"{cam_entity}", camera_from_world)
 
     def log_target_poses(self, target_poses):
-        rr.log("world/target_poses", rr.Points3D(target_poses, colors=[0,255,0], radii=0.11))
+        self._submit("world/target_poses", self._log, "world/target_poses", rr.Points3D(target_poses, colors=[0,255,0], radii=0.11))
     
     def log_nodes_paths(self, nodes_paths):
-        rr.log(f"world/desired_node_path", rr.Points3D(nodes_paths, colors=[255, 192, 203], radii=0.11)) # pink
-        rr.log("world/desired_node_path_edges", rr.LineStrips3D(nodes_paths, colors=[255, 192, 203])) # pink
+        self._submit("world/desired_node_path", self._log, f"world/desired_node_path", rr.Points3D(nodes_paths, colors=[255, 192, 203], radii=0.11)) # pink
+        self._submit("world/desired_node_path_edges", self._log, "world/desired_node_path_edges", rr.LineStrips3D(nodes_paths, colors=[255, 192, 203])) # pink
 
     def log_text_data(self, text):
-        rr.log(
+        # Planner outputs are never dropped
+        self._submit(
+            "PlannerOutput",
+            self._log,
             "PlannerOutput",
             rr.TextDocument(
                 text,
                 media_type=rr.MediaType.TEXT,
             ),
+            coalesce=False,
         )
 
     def log_navmesh_data(self, navmesh):
         # log the frontier nodes with color red
-        rr.log(
+        self._submit(
+            "world/navmesh_nodes",
+            self._log,
             f"world/navmesh_nodes",
             rr.Points3D(navmesh, colors=[255,255,255], radii=0.11)
         )
 
     def log_frontier_data(self, frontier_node_positions):
         # log the frontier nodes with color red
-        rr.log(
+        self._submit(
+            "world/frontier_nodes",
+            self._log,
             "world/frontier_nodes",
             rr.Points3D(frontier_node_positions, colors=[255,0,0], radii=0.08)
         )
 
     def log_selected_frontier_data(self, frontier_node_positions):
         # log the frontier nodes with color red
-        rr.log(
+        self._submit(
+            "world/selected_frontier_nodes",
+            self._log,
             "world/selected_frontier_nodes",
             rr.Points3D(frontier_node_positions, colors=[255, 255, 0], radii=0.08)
         )
     
     def log_place_data(self, place_node_positions):
         # log the place nodes with color red
-        rr.log(
+        self._submit(
+            "world/place_nodes",
+            self._log,
             "world/place_nodes",
             rr.Points3D(place_node_positions, colors=[255,255,255], radii=0.08)
         )
 
     def log_inplane_place_data(self, place_node_positions):
         # log the place nodes with color red
-        rr.log(
+        self._submit(
+            "world/inplane_place_nodes",
+            self._log,
             "world/inplane_place_nodes",
             rr.Points3D(place_node_positions, colors=[244, 5, 244], radii=0.09)
         )
 
     def log_bb_data(self, bb_info):
-        rr.log(
+        self._submit("/world/annotations/bb", self._log_bb, bb_info)
+
+    def _log_bb(self, bb_info):
+        self._log(
             "/world/annotations/bb",
             rr.Boxes3D(
                 half_sizes=bb_info['bb_half_sizes'],
@@ -207,30 +457,43 @@ class RRLogger:
         )
 
     def log_img_data(self, rgb, labels):
+        # JPEG compression happens on the writer thread
+        self._submit(f"{self.primary_camera_entity}/rgb", self._log_img, rgb, labels)
+
+    def _log_img(self, rgb, labels):
         # log the camera transform, rgb image, and depth image
         # rr.log("world/agent", rr.Transform3D(transform=camera_from_world))
         # rr.log("world/agent", rr.Pinhole(image_from_camera=intrinsic, resolution=[w, h]))
-        rr.log(f"{self.primary_camera_entity}/rgb", rr.Image(rgb).compress(jpeg_quality=95))
-        rr.log(f"{self.primary_camera_entity}/semantic", rr.SegmentationImage(labels))
+        self._log(f"{self.primary_camera_entity}/rgb", rr.Image(_downscale(rgb, self._max_image_size)).compress(jpeg_quality=self._jpeg_quality))
+        self._log(f"{self.primary_camera_entity}/semantic", rr.SegmentationImage(_downscale(labels, self._max_image_size)))
         # rr.log(f"{self.primary_camera_entity}/semantic", rr.Image(data.colormap(data.labels)).compress(jpeg_quality=95))
 
     def log_rosbag_img_data(self, data):
+        self._submit(f"{self.primary_camera_entity}/rgb", self._log_rosbag_img, data.rgb, data.depth, data.semantic_image)
+
+    def _log_rosbag_img(self, rgb, depth, semantic_image):
         # log the camera transform, rgb image, and depth image
         # rr.log("world/agent", rr.Transform3D(transform=camera_from_world))
         # rr.log("world/agent", rr.Pinhole(image_from_camera=intrinsic, resolution=[w, h]))
-        rr.log(f"{self.primary_camera_entity}/rgb", rr.Image(np.transpose(data.rgb, axes=(1, 0, 2))).compress(jpeg_quality=95))
-        rr.log(f"{self.primary_camera_entity}/depth", rr.DepthImage(data.depth.T, meter=1.0))
-        rr.log(f"{self.primary_camera_entity}/semantic", rr.SegmentationImage(data.semantic_image[:, :, 0].T))
+        self._log(f"{self.primary_camera_entity}/rgb", rr.Image(_downscale(np.transpose(rgb, axes=(1, 0, 2)), self._max_image_size)).compress(jpeg_quality=self._jpeg_quality))
+        self._log(f"{self.primary_camera_entity}/depth", rr.DepthImage(_downscale(depth.T, self._max_image_size), meter=1.0))
+        self._log(f"{self.primary_camera_entity}/semantic", rr.SegmentationImage(_downscale(semantic_image[:, :, 0].T, self._max_image_size)))
 
     def log_2d_frontier_data(self, unoccupied, unexplored, tsdf):
-        rr.log(f"{self.primary_camera_entity}/unoccupied", rr.Image(unoccupied).compress(jpeg_quality=95))
-        rr.log(f"{self.primary_camera_entity}/unexplored", rr.Image(unexplored).compress(jpeg_quality=95))
-        rr.log(f"{self.primary_camera_entity}/tsdf", rr.Image(tsdf).compress(jpeg_quality=95))
+        self._submit(f"{self.primary_camera_entity}/unoccupied", self._log_2d_frontier, unoccupied, unexplored, tsdf)
+
+    def _log_2d_frontier(self, unoccupied, unexplored, tsdf):
+        self._log(f"{self.primary_camera_entity}/unoccupied", rr.Image(unoccupied).compress(jpeg_quality=95))
+        self._log(f"{self.primary_camera_entity}/unexplored", rr.Image(unexplored).compress(jpeg_quality=95))
+        self._log(f"{self.primary_camera_entity}/tsdf", rr.Image(tsdf).compress(jpeg_quality=95))
 
     def log_3d_frontier_data(self, unoccupied_reachable_normal, frontiers_normal, frontiers_unoccupied):
-        rr.log(f"world/tsdf_unoccupied", rr.Points3D(unoccupied_reachable_normal, colors=[255, 0, 0], radii=0.06))
-        rr.log(f"world/tsdf_frontiers", rr.Points3D(frontiers_normal, colors=[255, 255, 255], radii=0.08))
-        rr.log(f"world/tsdf_explored", rr.Points3D(frontiers_unoccupied, colors=[200, 180, 150], radii=0.08))
+        self._submit("world/tsdf_unoccupied", self._log_3d_frontier, unoccupied_reachable_normal, frontiers_normal, frontiers_unoccupied)
+
+    def _log_3d_frontier(self, unoccupied_reachable_normal, frontiers_normal, frontiers_unoccupied):
+        self._log(f"world/tsdf_unoccupied", rr.Points3D(unoccupied_reachable_normal, colors=[255, 0, 0], radii=0.06))
+        self._log(f"world/tsdf_frontiers", rr.Points3D(frontiers_normal, colors=[255, 255, 255], radii=0.08))
+        self._log(f"world/tsdf_explored", rr.Points3D(frontiers_unoccupied, colors=[200, 180, 150], radii=0.08))
     
     def log_hydra_graph(
             self, 
@@ -244,25 +507,60 @@ class RRLogger:
 
         if is_node:
             node_pos_source[2] += self._node_offset[node_type]
-            rr.log(
-                f"world/hydra_graph/nodes/{node_type}/{nodeid}",
-                rr.Points3D(node_pos_source, colors=self._node_color_map[node_type], radii=0.09)
-            )
+            entity = f"world/hydra_graph/nodes/{node_type}/{nodeid}"
+            self._submit(entity, self._log, entity, rr.Points3D(node_pos_source, colors=self._node_color_map[node_type], radii=0.09))
         else: # edge
             source_type = edge_type.split('-to-')[0]
             target_type = edge_type.split('-to-')[1]
 
             node_pos_source[2] += self._node_offset[source_type]
             node_pos_target[2] += self._node_offset[target_type]
-            rr.log(f"world/hydra_graph/edges/{edge_type}/{edgeid}", rr.Arrows3D(
+            entity = f"world/hydra_graph/edges/{edge_type}/{edgeid}"
+            self._submit(entity, self._log, entity, rr.Arrows3D(
                 origins=node_pos_source,  # Base position of the arrow
                 vectors=(node_pos_target-node_pos_source),  # Direction and length of the arrow
                 colors=self._edge_color_map[edge_type]
             ))
 
+    def log_hydra_nodes(self, node_type, positions, labels=None):
+        # One Points3D entity per node type, replaced as a whole on every flush. The caller marks
+        # the type clean once submitted, so the batch is never evicted from the writer queue
+        entity = f"world/hydra_graph/nodes/{node_type}"
+        if len(positions) == 0:
+            self._submit(entity, self._clear, entity, evictable=False)
+            return
+        positions = np.array(positions, dtype=float).reshape(-1, 3)
+        positions[:, 2] += self._node_offset[node_type]
+        self._submit(entity, self._log, entity, rr.Points3D(positions, colors=self._node_color_map[node_type], radii=0.09, labels=labels), evictable=False)
+
+    def log_hydra_edges(self, edge_type, source_positions, target_positions):
+        # One Arrows3D batch per edge type
+        entity = f"world/hydra_graph/edges/{edge_type}"
+        if len(source_positions) == 0:
+            self._submit(entity, self._clear, entity, evictable=False)
+            return
+        source_type, target_type = edge_type.split('-to-')
+        origins = np.array(source_positions, dtype=float).reshape(-1, 3)
+        targets = np.array(target_positions, dtype=float).reshape(-1, 3)
+        origins[:, 2] += self._node_offset[source_type]
+        targets[:, 2] += self._node_offset[target_type]
+        self._submit(entity, self._log, entity, rr.Arrows3D(
+            origins=origins,
+            vectors=targets-origins,
+            colors=self._edge_color_map.get(edge_type, [255,255,255])
+        ), evictable=False)
+
     def step(self):
         self._t += self._dt
+        self._frame += 1
         rr.set_time_seconds(self._timeline, self._t)
 
+    def _clear(self, namespace):
+        self._log(namespace, rr.Clear(recursive=True))
+
     def log_clear(self, namespace):
-        rr.log(namespace, rr.Clear(recursive=True))
\ No newline at end of file
+        # Ordered with the calls around it, never coalesced. Decimated like the entity it clears,
+        # so a namespace is not cleared on a frame where its re-log is skipped
+        if not self.enabled(namespace):
+            return
+        self._submit(namespace, self._clear, namespace, coalesce=False)
@@ -288,3 +288,111 @@ def pcwrite(filename, xyzrgb):
                 rgb[i, 2],
             )
         )
+
+
+_PLY_VERTEX_DTYPE = np.dtype(
+    [
+        ("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+        ("nx", "<f4"), ("ny", "<f4"), ("nz", "<f4"),
+        ("red", "u1"), ("green", "u1"), ("blue", "u1"),
+    ]
+)
+_PLY_POINT_DTYPE = np.dtype(
+    [
+        ("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+        ("red", "u1"), ("green", "u1"), ("blue", "u1"),
+    ]
+)
+_PLY_FACE_DTYPE = np.dtype([("n", "u1"), ("vertex_index", "<i4", (3,))])
+
+# Element counts are zero-padded to a fixed width so the streaming writer can
+# patch them in place once the totals are known.
+_PLY_COUNT_FMT = "%010d"
+
+
+def _ply_header(vertex_dtype, num_verts, num_faces=None):
+    ply_types = {"<f4": "float", "u1": "uchar"}
+    lines = ["ply", "format binary_little_endian 1.0"]
+    lines.append("element vertex " + _PLY_COUNT_FMT % num_verts)
+    for name in vertex_dtype.names:
+        lines.append("property %s %s" % (ply_types[vertex_dtype[name].str.lstrip("|")], name))
+    if num_faces is not None:
+        lines.append("element face " + _PLY_COUNT_FMT % num_faces)
+        lines.append("property list uchar int vertex_index")
+    lines.append("end_header")
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def _pack_mesh_vertices(verts, norms, colors):
+    vertex_data = np.empty(verts.shape[0], dtype=_PLY_VERTEX_DTYPE)
+    vertex_data["x"], vertex_data["y"], vertex_data["z"] = verts[:, 0], verts[:, 1], verts[:, 2]
+    vertex_data["nx"], vertex_data["ny"], vertex_data["nz"] = norms[:, 0], norms[:, 1], norms[:, 2]
+    vertex_data["red"], vertex_data["green"], vertex_data["blue"] = colors[:, 0], colors[:, 1], colors[:, 2]
+    return vertex_data
+
+
+def _pack_faces(faces):
+    face_data = np.empty(faces.shape[0], dtype=_PLY_FACE_DTYPE)
+    face_data["n"] = 3
+    face_data["vertex_index"] = faces[:, :3]
+    return face_data
+
+
+def meshwrite_binary(filename, verts, faces, norms, colors, chunk_size=None):
+    """Save a 3D mesh to a binary little-endian .ply file.
+
+    Same arguments as `meshwrite`, but vertices and faces are each packed into
+    a structured array and written with a single `tofile` call. With chunk_size
+    they are packed and written `chunk_size` rows at a time instead, so only one
+    chunk is copied at once.
+    """
+    if chunk_size is not None:
+        vertex_chunks = (
+            (verts[i:i + chunk_size], norms[i:i + chunk_size], colors[i:i + chunk_size])
+            for i in range(0, verts.shape[0], chunk_size)
+        )
+        face_chunks = (faces[i:i + chunk_size] for i in range(0, faces.shape[0], chunk_size))
+        meshwrite_stream(filename, vertex_chunks, face_chunks)
+        return
+    with open(filename, "wb") as ply_file:
+        ply_file.write(_ply_header(_PLY_VERTEX_DTYPE, verts.shape[0], faces.shape[0]))
+        _pack_mesh_vertices(verts, norms, colors).tofile(ply_file)
+        _pack_faces(faces).tofile(ply_file)
+
+
+def pcwrite_binary(filename, xyzrgb):
+    """Save a point cloud to a binary little-endian .ply file."""
+    point_data = np.empty(xyzrgb.shape[0], dtype=_PLY_POINT_DTYPE)
+    for i, name in enumerate(_PLY_POINT_DTYPE.names):
+        point_data[name] = xyzrgb[:, i]
+
+    with open(filename, "wb") as ply_file:
+        ply_file.write(_ply_header(_PLY_POINT_DTYPE, xyzrgb.shape[0]))
+        point_data.tofile(ply_file)
+
+
+def meshwrite_stream(filename, vertex_chunks, face_chunks):
+    """Save a mesh to a binary .ply file chunk by chunk.
+
+    For meshes that do not fit in memory at once. Element counts are written
+    as placeholders and patched once both iterables are exhausted.
+
+    vertex_chunks: iterable of (verts, norms, colors) arrays, in vertex order
+    face_chunks: iterable of (F, 3) face arrays indexing the global vertex list
+    """
+    num_verts, num_faces = 0, 0
+    with open(filename, "wb") as ply_file:
+        header = _ply_header(_PLY_VERTEX_DTYPE, 0, 0)
+        ply_file.write(header)
+        for verts, norms, colors in vertex_chunks:
+            _pack_mesh_vertices(verts, norms, colors).tofile(ply_file)
+            num_verts += verts.shape[0]
+        for faces in face_chunks:
+            _pack_faces(faces).tofile(ply_file)
+            num_faces += faces.shape[0]
+
+        final_header = _ply_header(_PLY_VERTEX_DTYPE, num_verts, num_faces)
+        assert len(final_header) == len(header), "[!] PLY element count overflowed header width."
+        ply_file.seek(0)
+        ply_file.write(final_header)
+    return num_verts, num_faces
@@ -45,6 +45,10 @@ from .geom import (
     rigid_transform,
     run_dijkstra,
     fps,
+    meshwrite,
+    meshwrite_binary,
+    pcwrite,
+    pcwrite_binary,
 )
 
 
@@ -405,6 +409,21 @@ class TSDFPlanner:
         colors = colors.astype(np.uint8)
         return verts, faces, norms, colors
 
+    def export_map(self, output_path, binary=True, chunk_size=None):
+        """Write the TSDF mesh and point cloud to tsdf_mesh.ply and tsdf_pc.ply in output_path.
+
+        binary writes little-endian binary PLY, otherwise the ASCII format is used.
+        chunk_size bounds how many mesh rows are packed at once in binary mode.
+        """
+        verts, faces, norms, colors = self.get_mesh()
+        point_cloud = self.get_point_cloud()
+        if binary:
+            meshwrite_binary(output_path / "tsdf_mesh.ply", verts, faces, norms, colors, chunk_size=chunk_size)
+            pcwrite_binary(output_path / "tsdf_pc.ply", point_cloud)
+        else:
+            meshwrite(output_path / "tsdf_mesh.ply", verts, faces, norms, colors)
+            pcwrite(output_path / "tsdf_pc.ply", point_cloud)
+
     ############# For building semantic map and exploration #############
 
     def find_prompt_points_within_view(
@@ -471,13 +490,13 @@ class TSDFPlanner:
             unoccupied_reachable_in_view = np.empty((0, 2))
 
         # Check unoccupied between point and current point - skip if any occupied
-        unoccupied_reachable_in_view_new = np.empty((0, 2))
-        for point in unoccupied_reachable_in_view:
-            if not self.check_occupied_between(point, cur_point, occupied, threshold=1):
-                unoccupied_reachable_in_view_new = np.concatenate(
-                    (unoccupied_reachable_in_view_new, [point]), axis=0
-                )
-        unoccupied_reachable_in_view = unoccupied_reachable_in_view_new
+        if len(unoccupied_reachable_in_view) > 0:
+            blocked = self.check_occupied_between_batch(
+                unoccupied_reachable_in_view, cur_point, occupied, threshold=1
+            )
+            unoccupied_reachable_in_view = unoccupied_reachable_in_view[
+                np.logical_not(blocked)
+            ].astype(float)
 
         # Only keep points within desired range
         if len(unoccupied_reachable_in_view) > 0:
@@ -887,27 +906,24 @@ class TSDFPlanner:
 
                     # Move back in the opposite direction of the normal by spacing, so the robot can see the frontier
                     # there is a chance that the point is outside the free space
-                    next_point = np.array(max_point, dtype=float)
                     max_backtrack = int(frontier_spacing / self._voxel_size)
                     min_backtrack = 2
-                    num_backtrack = 0
-                    while 1:
-                        next_point -= direction
-                        num_backtrack += 1
-                        if num_backtrack >= max_backtrack:
-                            break
-
-                        # break if close to boundary
-                        if not self.check_within_bnds(next_point):
-                            break
-
-                        # break if occupied
-                        if (
-                            occupied[int(next_point[0]), int(next_point[1])]
-                            or not island[int(next_point[0]), int(next_point[1])]
-                        ):
-                            next_point += 2 * direction
-                            break
+                    # all backtracking steps at once, accumulated step by step as in a sequential walk
+                    num_steps = max(max_backtrack, 1)
+                    steps = np.subtract.accumulate(
+                        np.vstack((max_point, np.tile(direction, (num_steps, 1)))).astype(float), axis=0
+                    )[1:]
+                    # stop close to the boundary or at an occupied point, always at max_backtrack
+                    within_bnds = self.check_within_bnds_batch(steps)
+                    blocked = np.zeros(num_steps, dtype=bool)
+                    idx = steps[within_bnds].astype(int)
+                    blocked[within_bnds] = occupied[idx[:, 0], idx[:, 1]] | ~island[idx[:, 0], idx[:, 1]]
+                    stop = ~within_bnds | blocked
+                    stop[-1] = True
+                    num_backtrack = int(np.argmax(stop)) + 1
+                    next_point = steps[num_backtrack - 1]
+                    if num_backtrack < max_backtrack and blocked[num_backtrack - 1]:
+                        next_point = next_point + 2 * direction
                     next_point = np.round(next_point).astype(int)
                     if (
                         num_backtrack >= min_backtrack
@@ -1115,6 +1131,63 @@ class TSDFPlanner:
         points_occupied = np.sum(occupied[points_between[:, 0], points_between[:, 1]])
         return points_occupied > threshold
 
+    def check_occupied_between_batch(self, p1s, p2s, occupied, threshold):
+        """Batched `check_occupied_between` for M point pairs.
+
+        Args:
+          p1s (ndarray): (M, 2+) voxel coordinates of the segment starts.
+          p2s (ndarray): (M, 2+) voxel coordinates of the segment ends, or a
+            single point shared by all segments.
+          occupied (ndarray): 2D occupancy grid.
+          threshold (int): a segment is blocked if more cells than this are occupied.
+        Returns:
+          ndarray: (M,) boolean mask of blocked segments.
+        """
+        counts, _ = self.occupied_along_segments(p1s, p2s, occupied)
+        return counts > threshold
+
+    def occupied_along_segments(self, p1s, p2s, occupied):
+        """Occupied-cell counts and first occupied cell along M segments.
+
+        Returns:
+          counts (ndarray): (M,) number of occupied cells sampled on each segment.
+          first_hit (ndarray): (M, 2) first occupied cell walking from p1 to p2,
+            or (-1, -1) if the segment is free.
+        """
+        p1s = np.atleast_2d(p1s)[:, :2]
+        p2s = np.broadcast_to(np.atleast_2d(p2s)[:, :2], p1s.shape)
+        return TSDFPlanner.count_occupied_between(
+            np.ascontiguousarray(p1s, dtype=np.int64),
+            np.ascontiguousarray(p2s, dtype=np.int64),
+            np.ascontiguousarray(occupied),
+        )
+
+    @staticmethod
+    @njit(parallel=True)
+    def count_occupied_between(p1s, p2s, occupied):
+        """Walk each segment p1s[i] -> p2s[i] in unit steps (same sampling as
+        `check_occupied_between`) and count the occupied cells it crosses."""
+        num_pairs = p1s.shape[0]
+        counts = np.zeros(num_pairs, dtype=np.int64)
+        first_hit = -np.ones((num_pairs, 2), dtype=np.int64)
+        for i in prange(num_pairs):
+            dx = float(p2s[i, 0] - p1s[i, 0])
+            dy = float(p2s[i, 1] - p1s[i, 1])
+            length = np.sqrt(dx * dx + dy * dy)
+            num_points = int(length)
+            if length > 0:
+                dx /= length
+                dy /= length
+            for k in range(num_points + 1):
+                x = int(p1s[i, 0] + dx * k)
+                y = int(p1s[i, 1] + dy * k)
+                if occupied[x, y] != 0:
+                    counts[i] += 1
+                    if first_hit[i, 0] < 0:
+                        first_hit[i, 0] = x
+                        first_hit[i, 1] = y
+        return counts, first_hit
+
     def check_within_bnds(self, pts, slack=0):
         return not (
             pts[0] <= slack
@@ -1123,6 +1196,16 @@ class TSDFPlanner:
             or pts[1] >= self._vol_dim[1] - slack
         )
 
+    def check_within_bnds_batch(self, pts, slack=0):
+        """Vectorized `check_within_bnds` over an (N, 2+) array of voxel coordinates."""
+        pts = np.atleast_2d(pts)
+        return (
+            (pts[:, 0] > slack)
+            & (pts[:, 0] < self._vol_dim[0] - slack)
+            & (pts[:, 1] > slack)
+            & (pts[:, 1] < self._vol_dim[1] - slack)
+        )
+
     def clip_2d_array(self, array):
         return array[
             (array[:, 0] >= 0)
@@ -0,0 +1,499 @@
+from itertools import compress
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+NODE_TYPES = ('object', 'region', 'room', 'building', 'agent', 'frontier')
+_NODE_TYPE_CODES = {node_type: code for code, node_type in enumerate(NODE_TYPES)}
+
+
+def node_type_of(nodeid):
+    return str(nodeid).rsplit('_', 1)[0]
+
+
+class _NodeView:
+    """Read-only `graph.nodes[nodeid]` access to node attribute dicts, as with a NetworkX graph."""
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, nodeid):
+        return self._store.node_attr(nodeid)
+
+    def __contains__(self, nodeid):
+        return self._store.has_node(nodeid)
+
+    def __iter__(self):
+        return iter(self._store.node_ids())
+
+    def __len__(self):
+        return len(self._store)
+
+
+class SceneGraphStore:
+    """Columnar directed scene graph: node and edge tables in contiguous NumPy arrays.
+
+    Nodes are rows holding a position, layer, type code, interned name id,
+    semantic label, timestamp and bounding box half sizes. Edges are rows of
+    (source row, target row, type id, source name id, target name id), with CSR
+    adjacency built lazily for successor / predecessor queries. Removed rows are
+    only masked out and there are no per-node attribute dicts: the NetworkX
+    DiGraph with the usual attribute dicts is an export view (`to_networkx`),
+    only built on request.
+
+    Nodes and edges can be given a sort key (major, minor). Iteration, the
+    export and adjacency list keyed nodes by key, then the others in
+    insertion order, and each node's edges the same way. A graph that is
+    updated in place therefore iterates in the same order as one built from
+    scratch with the same keys.
+
+    `checkpoint` / `rollback` undo everything done since the checkpoint, so
+    per-update post-processing can be applied to a long-lived graph and
+    reverted without copying it.
+    """
+    _NODE_COLUMNS = ('position', 'layer', 'node_type', 'name_id', 'label', 'timestamp', 'bbox_half_size', 'node_alive', '_has_position', '_has_label', 'sort_major', 'sort_minor')
+    _EDGE_COLUMNS = ('edge_source', 'edge_target', 'edge_type_id', 'edge_source_name_id', 'edge_target_name_id', 'edge_alive', 'edge_sort_major', 'edge_sort_minor')
+    _UNKEYED = np.iinfo(np.int64).max # sort major of rows without a key, minor is the row
+
+    def __init__(self, capacity=64):
+        self._strings, self._string_ids = [], {}
+        self._node_ids, self._node_rows = [], {}
+        self._alloc_nodes(capacity)
+        self._edge_rows = {} # (source row, target row) -> edge row
+        self._alloc_edges(capacity)
+        self._num_nodes, self._num_edges = 0, 0
+        self._num_alive_nodes, self._num_alive_edges = 0, 0
+        self._version = 0
+        self._order = None
+        self._csr = None
+        self._checkpoint = None
+        self.nodes = _NodeView(self)
+
+    def _alloc_nodes(self, capacity):
+        self.position = np.full((capacity, 3), np.nan)
+        self.layer = np.full(capacity, -1, dtype=np.int16) # -1: not set
+        self.node_type = np.full(capacity, -1, dtype=np.int8)
+        self.name_id = np.full(capacity, -1, dtype=np.int32)
+        self.label = np.full(capacity, -1, dtype=np.int64)
+        self.timestamp = np.full(capacity, np.nan)
+        self.bbox_half_size = np.full((capacity, 3), np.nan, dtype=np.float32)
+        self.node_alive = np.zeros(capacity, dtype=bool)
+        self._has_position = np.zeros(capacity, dtype=bool)
+        self._has_label = np.zeros(capacity, dtype=bool)
+        self.sort_major = np.full(capacity, self._UNKEYED, dtype=np.int64)
+        self.sort_minor = np.zeros(capacity, dtype=np.uint64)
+
+    def _alloc_edges(self, capacity):
+        self.edge_source = np.full(capacity, -1, dtype=np.int64)
+        self.edge_target = np.full(capacity, -1, dtype=np.int64)
+        self.edge_type_id = np.full(capacity, -1, dtype=np.int32)
+        self.edge_source_name_id = np.full(capacity, -1, dtype=np.int32)
+        self.edge_target_name_id = np.full(capacity, -1, dtype=np.int32)
+        self.edge_alive = np.zeros(capacity, dtype=bool)
+        self.edge_sort_major = np.full(capacity, self._UNKEYED, dtype=np.int64)
+        self.edge_sort_minor = np.zeros(capacity, dtype=np.uint64)
+
+    @staticmethod
+    def _grow(array, size):
+        if size <= len(array):
+            return array
+        grown = np.empty((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _ensure_node_capacity(self, size):
+        if size > len(self.node_alive):
+            for name in self._NODE_COLUMNS:
+                setattr(self, name, self._grow(getattr(self, name), size))
+
+    def _ensure_edge_capacity(self, size):
+        if size > len(self.edge_alive):
+            for name in self._EDGE_COLUMNS:
+                setattr(self, name, self._grow(getattr(self, name), size))
+
+    def _intern(self, string):
+        if string is None:
+            return -1
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(string)
+            self._string_ids[string] = string_id
+        return string_id
+
+    def string(self, string_id):
+        return self._strings[string_id] if string_id >= 0 else None
+
+    def _mutated(self):
+        self._version += 1
+        self._order = None
+        self._csr = None
+
+    # ---------------------------------------------------------------- nodes
+
+    def __len__(self):
+        return self._num_alive_nodes
+
+    def __contains__(self, nodeid):
+        return nodeid in self._node_rows
+
+    def has_node(self, nodeid):
+        return nodeid in self._node_rows
+
+    def number_of_edges(self):
+        return self._num_alive_edges
+
+    def row(self, nodeid):
+        return self._node_rows[nodeid]
+
+    def node_ids(self, node_type=None):
+        """Ids of live nodes in order, optionally only those of one node type (or a tuple of types)."""
+        rows = self._ordered()[0]
+        if node_type is not None:
+            node_types = (node_type,) if isinstance(node_type, str) else node_type
+            rows = rows[np.isin(self.node_type[rows], [_NODE_TYPE_CODES[node_type] for node_type in node_types])]
+        return self.node_ids_at(rows)
+
+    def node_ids_at(self, rows):
+        return [self._node_ids[row] for row in np.asarray(rows).tolist()]
+
+    def layer_of(self, nodeid, default=0):
+        layer = self.layer[self._node_rows[nodeid]]
+        return int(layer) if layer >= 0 else default
+
+    def add_node(self, nodeid, attr=None, bbox_half_size=None, sort_key=None):
+        """Add a node, or update the given attributes of an existing one (as nx.DiGraph.add_node).
+
+        sort_key is an optional (major, minor) pair of integers ordering the node before unkeyed ones.
+        """
+        attr = attr or {}
+        row = self._node_rows.get(nodeid)
+        if row is None:
+            row = self._num_nodes
+            self._ensure_node_capacity(row + 1)
+            self._num_nodes += 1
+            self._num_alive_nodes += 1
+            self._node_ids.append(nodeid)
+            self._node_rows[nodeid] = row
+            self.position[row], self.bbox_half_size[row], self.timestamp[row] = np.nan, np.nan, np.nan
+            self.layer[row], self.name_id[row], self.label[row] = -1, -1, -1
+            self._has_position[row], self._has_label[row] = False, False
+            self.node_alive[row] = True
+            self.node_type[row] = _NODE_TYPE_CODES.get(node_type_of(nodeid), -1)
+            self.sort_major[row], self.sort_minor[row] = self._UNKEYED, row
+        else:
+            self._save_nodes([row])
+        if sort_key is not None:
+            self.sort_major[row], self.sort_minor[row] = sort_key
+        for key, value in attr.items():
+            if key == 'position':
+                self.position[row] = value
+                self._has_position[row] = True
+            elif key == 'name':
+                self.name_id[row] = self._intern(value)
+            elif key == 'layer':
+                self.layer[row] = value
+            elif key == 'timestamp':
+                self.timestamp[row] = value
+            elif key == 'label':
+                self.label[row] = value
+                self._has_label[row] = True
+            else:
+                raise KeyError(f'Node attribute {key} has no column in the scene graph store')
+        if bbox_half_size is not None:
+            self.bbox_half_size[row] = bbox_half_size
+        self._mutated()
+
+    def add_nodes_from(self, nodes):
+        for nodeid, attr in nodes:
+            self.add_node(nodeid, attr)
+
+    def set_node_attr(self, nodeid, key, value):
+        self.add_node(nodeid, {key: value})
+
+    def remove_nodes_from(self, nodeids):
+        removed = {nodeid: self._node_rows.pop(nodeid) for nodeid in nodeids if nodeid in self._node_rows}
+        if len(removed) == 0:
+            return
+        rows = np.fromiter(removed.values(), dtype=np.int64, count=len(removed))
+        self._save_nodes(rows, removed)
+        self.node_alive[rows] = False
+        self._num_alive_nodes -= len(rows)
+        # Incident edges go with their nodes
+        num_edges = self._num_edges
+        incident = self.edge_alive[:num_edges] & (np.isin(self.edge_source[:num_edges], rows) | np.isin(self.edge_target[:num_edges], rows))
+        edge_rows = np.flatnonzero(incident)
+        removed_edges = {key: self._edge_rows.pop(key) for key in zip(self.edge_source[edge_rows].tolist(), self.edge_target[edge_rows].tolist())}
+        self._save_edges(edge_rows, removed_edges)
+        self.edge_alive[:num_edges][incident] = False
+        self._num_alive_edges -= int(incident.sum())
+        self._mutated()
+
+    def remove_node(self, nodeid):
+        self.remove_nodes_from([nodeid])
+
+    @staticmethod
+    def _fill_attrs(attrs, mask, key, values):
+        for attr, value in zip(compress(attrs, mask.tolist()), values):
+            attr[key] = value
+
+    def _strings_of(self, string_ids):
+        return [self._strings[string_id] for string_id in string_ids.tolist()]
+
+    def node_attrs(self, rows):
+        """Attribute dicts of node rows, in the same form (and key order) as the NetworkX export.
+
+        Each attribute is gathered for all rows at once from its column, the dicts only exist for the caller.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        attrs = [{} for _ in range(len(rows))]
+        mask = self._has_position[rows]
+        self._fill_attrs(attrs, mask, 'position', self.position[rows[mask]].tolist())
+        mask = self.name_id[rows] >= 0
+        self._fill_attrs(attrs, mask, 'name', self._strings_of(self.name_id[rows[mask]]))
+        mask = self.layer[rows] >= 0
+        self._fill_attrs(attrs, mask, 'layer', self.layer[rows[mask]].tolist())
+        mask = ~np.isnan(self.timestamp[rows])
+        self._fill_attrs(attrs, mask, 'timestamp', self.timestamp[rows[mask]].tolist())
+        mask = self._has_label[rows]
+        self._fill_attrs(attrs, mask, 'label', self.label[rows[mask]].tolist())
+        return attrs
+
+    def node_attr(self, nodeid):
+        return self.node_attrs([self._node_rows[nodeid]])[0]
+
+    def name(self, nodeid):
+        return self.string(self.name_id[self._node_rows[nodeid]])
+
+    def positions(self, nodeids):
+        """(N, 3) positions of the given nodes in one gather."""
+        rows = np.array([self._node_rows[nodeid] for nodeid in nodeids], dtype=np.int64)
+        return self.position[rows]
+
+    # ---------------------------------------------------------------- edges
+
+    def has_edge(self, source, target):
+        if source not in self._node_rows or target not in self._node_rows:
+            return False
+        return (self._node_rows[source], self._node_rows[target]) in self._edge_rows
+
+    def add_edge(self, source, target, attr=None, sort_key=None):
+        """Add an edge (adding missing endpoints), or update the attributes of an existing one.
+
+        sort_key orders the edge among the edges of its source, as for nodes.
+        """
+        attr = attr or {}
+        for nodeid in (source, target):
+            if nodeid not in self._node_rows:
+                self.add_node(nodeid)
+        key = (self._node_rows[source], self._node_rows[target])
+        edge_row = self._edge_rows.get(key)
+        if edge_row is None:
+            edge_row = self._num_edges
+            self._ensure_edge_capacity(edge_row + 1)
+            self._num_edges += 1
+            self._num_alive_edges += 1
+            self._edge_rows[key] = edge_row
+            self.edge_source[edge_row], self.edge_target[edge_row] = key
+            self.edge_type_id[edge_row] = self.edge_source_name_id[edge_row] = self.edge_target_name_id[edge_row] = -1
+            self.edge_alive[edge_row] = True
+            self.edge_sort_major[edge_row], self.edge_sort_minor[edge_row] = self._UNKEYED, edge_row
+        else:
+            self._save_edges([edge_row])
+        if sort_key is not None:
+            self.edge_sort_major[edge_row], self.edge_sort_minor[edge_row] = sort_key
+        if 'type' in attr:
+            self.edge_type_id[edge_row] = self._intern(attr['type'])
+        if 'source_name' in attr:
+            self.edge_source_name_id[edge_row] = self._intern(attr['source_name'])
+        if 'target_name' in attr:
+            self.edge_target_name_id[edge_row] = self._intern(attr['target_name'])
+        self._mutated()
+
+    def add_edges_from(self, edges):
+        for source, target, attr in edges:
+            self.add_edge(source, target, attr)
+
+    def remove_edge(self, source, target):
+        key = (self._node_rows[source], self._node_rows[target])
+        edge_row = self._edge_rows.pop(key)
+        self._save_edges([edge_row], {key: edge_row})
+        self.edge_alive[edge_row] = False
+        self._num_alive_edges -= 1
+        self._mutated()
+
+    def edge_attrs(self, edge_rows):
+        """Attribute dicts of edge rows, gathered per column as for nodes."""
+        edge_rows = np.asarray(edge_rows, dtype=np.int64)
+        attrs = [{} for _ in range(len(edge_rows))]
+        for key, column in (('source_name', self.edge_source_name_id), ('target_name', self.edge_target_name_id), ('type', self.edge_type_id)):
+            mask = column[edge_rows] >= 0
+            self._fill_attrs(attrs, mask, key, self._strings_of(column[edge_rows[mask]]))
+        return attrs
+
+    def edges(self):
+        """(source id, target id, attr) of live edges in order: by source, then by the edge's key."""
+        edge_rows = self._ordered()[1]
+        return list(zip(self.node_ids_at(self.edge_source[edge_rows]), self.node_ids_at(self.edge_target[edge_rows]), self.edge_attrs(edge_rows)))
+
+    def ordered_rows(self):
+        """Live node rows and live edge rows, in iteration order."""
+        return self._ordered()
+
+    def _ordered(self):
+        # Live node rows and live edge rows in iteration order
+        if self._order is None:
+            node_rows = np.flatnonzero(self.node_alive[:self._num_nodes])
+            node_rows = node_rows[np.lexsort((self.sort_minor[node_rows], self.sort_major[node_rows]))]
+            rank = np.zeros(max(1, self._num_nodes), dtype=np.int64)
+            rank[node_rows] = np.arange(len(node_rows))
+            edge_rows = np.flatnonzero(self.edge_alive[:self._num_edges])
+            edge_rows = edge_rows[np.lexsort((self.edge_sort_minor[edge_rows], self.edge_sort_major[edge_rows], rank[self.edge_source[edge_rows]]))]
+            self._order = node_rows, edge_rows
+        return self._order
+
+    def _adjacency(self):
+        # CSR over live edges, both directions, in edge order within each row
+        if self._csr is None:
+            edge_rows = self._ordered()[1]
+            csr = {}
+            for direction, (from_rows, to_rows) in {'out': (self.edge_source, self.edge_target), 'in': (self.edge_target, self.edge_source)}.items():
+                order = edge_rows[np.argsort(from_rows[edge_rows], kind='stable')]
+                indptr = np.zeros(self._num_nodes + 1, dtype=np.int64)
+                np.cumsum(np.bincount(from_rows[order], minlength=self._num_nodes), out=indptr[1:])
+                csr[direction] = (indptr, to_rows[order])
+            self._csr = csr
+        return self._csr
+
+    def successors(self, nodeid):
+        indptr, indices = self._adjacency()['out']
+        row = self._node_rows[nodeid]
+        return [self._node_ids[target] for target in indices[indptr[row]:indptr[row + 1]]]
+
+    def predecessors(self, nodeid):
+        indptr, indices = self._adjacency()['in']
+        row = self._node_rows[nodeid]
+        return [self._node_ids[source] for source in indices[indptr[row]:indptr[row + 1]]]
+
+    def hop_distances(self, nodeid):
+        """Undirected hop count from nodeid to every node row (inf if unreachable or removed), one BFS over the edge columns."""
+        edge_rows = self._ordered()[1]
+        adjacency = csr_matrix((np.ones(len(edge_rows)), (self.edge_source[edge_rows], self.edge_target[edge_rows])), shape=(self._num_nodes, self._num_nodes))
+        return shortest_path(adjacency, directed=False, unweighted=True, indices=self._node_rows[nodeid])
+
+    # ---------------------------------------------------------- checkpoints
+
+    def checkpoint(self):
+        """Start recording changes, replacing any previous checkpoint."""
+        self._checkpoint = {
+            'num_nodes': self._num_nodes, 'num_edges': self._num_edges,
+            'num_alive_nodes': self._num_alive_nodes, 'num_alive_edges': self._num_alive_edges,
+            'nodes': [], 'edges': [], # batches of (rows, column values) saved before each change
+            'node_rows': {}, 'edge_rows': {}, # lookup entries of removed rows
+        }
+
+    def _save_nodes(self, rows, removed=None):
+        if self._checkpoint is None:
+            return
+        num_nodes = self._checkpoint['num_nodes']
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows < num_nodes]
+        if len(rows) > 0:
+            self._checkpoint['nodes'].append((rows, {name: getattr(self, name)[rows].copy() for name in self._NODE_COLUMNS}))
+        if removed is not None:
+            self._checkpoint['node_rows'].update((nodeid, row) for nodeid, row in removed.items() if row < num_nodes)
+
+    def _save_edges(self, edge_rows, removed=None):
+        if self._checkpoint is None:
+            return
+        num_edges = self._checkpoint['num_edges']
+        edge_rows = np.asarray(edge_rows, dtype=np.int64)
+        edge_rows = edge_rows[edge_rows < num_edges]
+        if len(edge_rows) > 0:
+            self._checkpoint['edges'].append((edge_rows, {name: getattr(self, name)[edge_rows].copy() for name in self._EDGE_COLUMNS}))
+        if removed is not None:
+            self._checkpoint['edge_rows'].update((key, edge_row) for key, edge_row in removed.items() if edge_row < num_edges)
+
+    def rollback(self):
+        """Restore the graph to the last checkpoint and stop recording, a no-op without one."""
+        checkpoint, self._checkpoint = self._checkpoint, None
+        if checkpoint is None:
+            return
+        num_nodes, num_edges = checkpoint['num_nodes'], checkpoint['num_edges']
+        # Rows added since the checkpoint are dropped
+        new_edge_rows = np.flatnonzero(self.edge_alive[num_edges:self._num_edges]) + num_edges
+        for key in zip(self.edge_source[new_edge_rows].tolist(), self.edge_target[new_edge_rows].tolist()):
+            del self._edge_rows[key]
+        for row in np.flatnonzero(self.node_alive[num_nodes:self._num_nodes]) + num_nodes:
+            del self._node_rows[self._node_ids[row]]
+        self.node_alive[num_nodes:self._num_nodes] = False
+        self.edge_alive[num_edges:self._num_edges] = False
+        del self._node_ids[num_nodes:]
+        self._num_nodes, self._num_edges = num_nodes, num_edges
+        # Older rows get their saved values back, latest batch first so the values from before the first change win
+        for rows, values in reversed(checkpoint['nodes']):
+            for name, column in values.items():
+                getattr(self, name)[rows] = column
+        for edge_rows, values in reversed(checkpoint['edges']):
+            for name, column in values.items():
+                getattr(self, name)[edge_rows] = column
+        self._node_rows.update(checkpoint['node_rows'])
+        self._edge_rows.update(checkpoint['edge_rows'])
+        self._num_alive_nodes, self._num_alive_edges = checkpoint['num_alive_nodes'], checkpoint['num_alive_edges']
+        self._mutated()
+
+    # ---------------------------------------------------------------- views
+
+    def copy(self):
+        """Compacted copy: removed rows are dropped, iteration order is kept."""
+        return self._compact(self.node_alive[:self._num_nodes])
+
+    def subgraph(self, nodeids):
+        """Compacted copy of the given nodes and the edges between them, in this graph's order."""
+        keep = np.zeros(self._num_nodes, dtype=bool)
+        keep[[self._node_rows[nodeid] for nodeid in nodeids if nodeid in self._node_rows]] = True
+        return self._compact(keep)
+
+    def _compact(self, keep):
+        # keep: mask of the live node rows to copy, edges are copied when both endpoints are kept
+        node_rows = np.flatnonzero(keep)
+        other = SceneGraphStore(capacity=max(1, len(node_rows), self._num_alive_edges))
+        other._strings, other._string_ids = list(self._strings), dict(self._string_ids)
+        new_row = np.full(max(1, self._num_nodes), -1, dtype=np.int64)
+        new_row[node_rows] = np.arange(len(node_rows))
+        n = len(node_rows)
+        for name in self._NODE_COLUMNS:
+            getattr(other, name)[:n] = getattr(self, name)[node_rows]
+        other._node_ids = self.node_ids_at(node_rows)
+        other._node_rows = {nodeid: row for row, nodeid in enumerate(other._node_ids)}
+        num_edges = self._num_edges
+        edge_rows = np.flatnonzero(self.edge_alive[:num_edges] & (new_row[self.edge_source[:num_edges]] >= 0) & (new_row[self.edge_target[:num_edges]] >= 0))
+        m = len(edge_rows)
+        other.edge_source[:m] = new_row[self.edge_source[edge_rows]]
+        other.edge_target[:m] = new_row[self.edge_target[edge_rows]]
+        for name in self._EDGE_COLUMNS[2:]:
+            getattr(other, name)[:m] = getattr(self, name)[edge_rows]
+        other._edge_rows = {key: i for i, key in enumerate(zip(other.edge_source[:m].tolist(), other.edge_target[:m].tolist()))}
+        # Unkeyed rows are ordered by row, which compaction renumbers without reordering
+        other.sort_minor[:n][other.sort_major[:n] == self._UNKEYED] = np.flatnonzero(other.sort_major[:n] == self._UNKEYED)
+        other.edge_sort_minor[:m][other.edge_sort_major[:m] == self._UNKEYED] = np.flatnonzero(other.edge_sort_major[:m] == self._UNKEYED)
+        other._num_nodes = other._num_alive_nodes = n
+        other._num_edges = other._num_alive_edges = m
+        return other
+
+    def to_networkx(self):
+        """NetworkX DiGraph with the usual node / edge attribute dicts, built on every call."""
+        import networkx as nx
+
+        node_rows = self._ordered()[0]
+        graph = nx.DiGraph()
+        graph.add_nodes_from(zip(self.node_ids_at(node_rows), self.node_attrs(node_rows)))
+        graph.add_edges_from(self.edges())
+        return graph
+
+    @classmethod
+    def from_networkx(cls, graph):
+        store = cls(capacity=max(1, graph.number_of_nodes(), graph.number_of_edges()))
+        store.add_nodes_from(graph.nodes(data=True))
+        store.add_edges_from(graph.edges(data=True))
+        return store
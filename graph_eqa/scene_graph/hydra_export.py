@@ -0,0 +1,156 @@
+import numpy as np
+
+from graph_eqa.scene_graph.graph_store import NODE_TYPES
+
+# Hydra node symbol category -> scene graph node type
+CATEGORY_TYPES = {'a': 'agent', 'b': 'building', 'f': 'frontier', 'o': 'object', 'p': 'region', 'r': 'room'}
+
+_CATEGORY_LUT = np.full(256, -1, dtype=np.int8)
+for _category, _node_type in CATEGORY_TYPES.items():
+    _CATEGORY_LUT[ord(_category)] = _CATEGORY_LUT[ord(_category.upper())] = NODE_TYPES.index(_node_type)
+
+
+class HydraNodeTable:
+    """Hydra node ids, categories, positions, names and update times copied into NumPy arrays.
+
+    `nodes` keeps the binding objects so full records (bounding boxes, labels,
+    colors) are only read for nodes that actually changed.
+    """
+    def __init__(self, nodes, keys, categories, category_ids, positions, update_times, names):
+        self.nodes = nodes
+        self.keys = keys
+        self.categories = categories
+        self.category_ids = category_ids
+        self.positions = positions
+        self.update_times = update_times
+        self.names = names
+        self.node_types = _CATEGORY_LUT[categories]
+        self._key_order = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def category(self, i):
+        return chr(self.categories[i]).lower()
+
+    def node_type(self, i):
+        return NODE_TYPES[self.node_types[i]]
+
+    def node_ids(self, indices):
+        """Scene graph ids ('<node type>_<category id>') of the nodes at indices."""
+        return [f'{NODE_TYPES[node_type]}_{category_id}' for node_type, category_id in zip(self.node_types[indices].tolist(), self.category_ids[indices].tolist())]
+
+    def node_names(self, indices):
+        """Object names, and the node type for every other node."""
+        return [name if node_type == 'object' else node_type for name, node_type in zip(self.names[indices], (NODE_TYPES[code] for code in self.node_types[indices].tolist()))]
+
+    def lookup(self, keys):
+        """Index of each Hydra key in the table, -1 for keys it does not hold."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if len(self.keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        if self._key_order is None:
+            self._key_order = np.argsort(self.keys)
+        idx = np.minimum(np.searchsorted(self.keys[self._key_order], keys), len(self.keys) - 1)
+        idx = self._key_order[idx]
+        return np.where(self.keys[idx] == keys, idx, -1)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [table for table in tables if len(table) > 0]
+        if len(tables) == 0:
+            return export_nodes([])
+        return cls(
+            [node for table in tables for node in table.nodes],
+            *[np.concatenate([getattr(table, name) for table in tables]) for name in ('keys', 'categories', 'category_ids', 'positions', 'update_times', 'names')])
+
+
+def export_nodes(nodes):
+    """One pass over a layer's nodes, one binding access per field, into preallocated arrays."""
+    nodes = list(nodes)
+    num_nodes = len(nodes)
+    keys = np.empty(num_nodes, dtype=np.uint64)
+    categories = np.empty(num_nodes, dtype=np.uint8)
+    category_ids = np.empty(num_nodes, dtype=np.int64)
+    positions = np.empty((num_nodes, 3))
+    update_times = np.full(num_nodes, -1, dtype=np.int64)
+    names = np.empty(num_nodes, dtype=object)
+    for i, node in enumerate(nodes):
+        node_id, attributes = node.id, node.attributes
+        keys[i] = node_id.value
+        categories[i] = ord(node_id.category)
+        category_ids[i] = node_id.category_id
+        positions[i] = attributes.position
+        update_time = getattr(attributes, 'last_update_time_ns', None)
+        if update_time is not None:
+            update_times[i] = update_time
+        names[i] = getattr(attributes, 'name', None)
+    return HydraNodeTable(nodes, keys, categories, category_ids, positions, update_times, names)
+
+
+def export_graph_nodes(graph, extra_nodes=()):
+    """Node table of all static layers of a Hydra graph, preceded by extra_nodes (e.g. tracked agents)."""
+    layers = getattr(graph, 'layers', None)
+    layer_nodes = [layer.nodes for layer in layers] if layers is not None else [graph.nodes]
+    return HydraNodeTable.concat([export_nodes(extra_nodes)] + [export_nodes(nodes) for nodes in layer_nodes])
+
+
+def diff_node_tables(table, previous):
+    """Mask of nodes in table that are new or changed since previous, and the mask of previous' nodes that disappeared."""
+    if previous is None or len(previous) == 0:
+        return np.ones(len(table), dtype=bool), np.zeros(0 if previous is None else len(previous), dtype=bool)
+    prev = previous.lookup(table.keys)
+    found = prev >= 0
+    prev = np.maximum(prev, 0)
+    unchanged = (found
+                 & (previous.update_times[prev] == table.update_times)
+                 & np.all(previous.positions[prev] == table.positions, axis=1)
+                 & (previous.names[prev] == table.names))
+    removed = table.lookup(previous.keys) < 0
+    return ~unchanged, removed
+
+
+class HydraNodeColumns:
+    """Per-node NumPy columns (ids, names, boxes, ...) kept in Hydra key order and updated in batches.
+
+    A sync overwrites, inserts or drops all of its changed nodes at once, with
+    one searchsorted and one np.insert / np.delete per column, instead of
+    touching per-node Python objects.
+    """
+    def __init__(self, **columns):
+        # column name -> (dtype, shape of one node's value)
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.columns = {column: np.zeros((0,) + tuple(shape), dtype=dtype) for column, (dtype, shape) in columns.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def update(self, keys, **values):
+        """Set the values of keys, inserting the keys that are not held yet. Every column must be given."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if len(keys) == 0:
+            return
+        values = {column: np.asarray(values[column], dtype=array.dtype).reshape((len(keys),) + array.shape[1:])
+                  for column, array in self.columns.items()}
+        idx = np.searchsorted(self.keys, keys)
+        found = idx < len(self.keys)
+        found[found] = self.keys[idx[found]] == keys[found]
+        for column, array in self.columns.items():
+            array[idx[found]] = values[column][found]
+        new = np.flatnonzero(~found)
+        if len(new) > 0:
+            new = new[np.argsort(keys[new])]
+            at = np.searchsorted(self.keys, keys[new])
+            self.keys = np.insert(self.keys, at, keys[new])
+            for column, array in self.columns.items():
+                self.columns[column] = np.insert(array, at, values[column][new], axis=0)
+
+    def discard(self, keys):
+        keep = ~np.isin(self.keys, np.asarray(keys, dtype=np.uint64))
+        if not keep.all():
+            self.keys = self.keys[keep]
+            for column, array in self.columns.items():
+                self.columns[column] = array[keep]
@@ -0,0 +1,159 @@
+import os, copy, json, time
+import numpy as np
+import torch
+
+IMAGE_ENCODER_BACKENDS = ('torch', 'int8', 'onnx', 'onnx_int8')
+
+
+class ImageTower(torch.nn.Module):
+    """Image half of a CLIP/SigLIP model, returning L2-normalized image features.
+
+    Only the vision transformer and, for CLIP, the visual projection are held, so copies,
+    quantization and ONNX export never touch the text tower.
+    """
+    def __init__(self, model, image_size=None):
+        super().__init__()
+        self.vision_model = model.vision_model
+        # SigLIP pools with a head inside the vision model, CLIP projects the pooled output
+        self.projection = getattr(model, 'visual_projection', None) or torch.nn.Identity()
+        self.image_size = image_size
+        self.native_size = model.config.vision_config.image_size
+        self._interpolate = image_size is not None and image_size != self.native_size
+
+    def resize(self, pixel_values):
+        if self.image_size is None or tuple(pixel_values.shape[-2:]) == (self.image_size, self.image_size):
+            return pixel_values
+        return torch.nn.functional.interpolate(pixel_values, size=(self.image_size, self.image_size), mode='bilinear', align_corners=False)
+
+    def forward(self, pixel_values):
+        pixel_values = pixel_values.to(next(self.parameters()).device)
+        if self._interpolate:
+            outputs = self.vision_model(pixel_values=pixel_values, interpolate_pos_encoding=True)
+        else:
+            outputs = self.vision_model(pixel_values=pixel_values)
+        return torch.nn.functional.normalize(self.projection(outputs.pooler_output), dim=-1)
+
+
+class OnnxImageTower:
+    """ImageTower exported to ONNX and run with onnxruntime on CPU (optionally int8-quantized)."""
+    def __init__(self, tower, onnx_path, quantize=False, num_threads=None):
+        import onnxruntime as ort
+
+        image_size = tower.image_size or tower.native_size
+        self.image_size = image_size
+        fp32_path = str(onnx_path)
+        if not os.path.exists(fp32_path):
+            os.makedirs(os.path.dirname(os.path.abspath(fp32_path)), exist_ok=True)
+            dummy = torch.zeros(1, 3, image_size, image_size)
+            with torch.no_grad():
+                torch.onnx.export(
+                    tower.eval(), (dummy,), fp32_path,
+                    input_names=['pixel_values'], output_names=['image_features'],
+                    dynamic_axes={'pixel_values': {0: 'batch'}, 'image_features': {0: 'batch'}},
+                    opset_version=17)
+        model_path = fp32_path
+        if quantize:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            model_path = fp32_path.replace('.onnx', '_int8.onnx')
+            if not os.path.exists(model_path):
+                quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+
+        options = ort.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+    def resize(self, pixel_values):
+        if tuple(pixel_values.shape[-2:]) == (self.image_size, self.image_size):
+            return pixel_values
+        return torch.nn.functional.interpolate(pixel_values, size=(self.image_size, self.image_size), mode='bilinear', align_corners=False)
+
+    def __call__(self, pixel_values):
+        pixel_values = pixel_values.detach().cpu().numpy().astype(np.float32)
+        features, = self._session.run(['image_features'], {'pixel_values': pixel_values})
+        return torch.from_numpy(features)
+
+
+def build_image_encoder(model, backend='torch', image_size=None, onnx_dir=None, model_name='image_tower', num_threads=None):
+    """Callable mapping processor pixel_values to normalized image features.
+
+    'torch' is the fp32 model as loaded. 'int8' applies PyTorch dynamic int8
+    quantization to the Linear layers of a copy of the image tower. 'onnx' / 'onnx_int8' export the tower once to onnx_dir
+    and run it with onnxruntime on CPU. image_size overrides the input
+    resolution, with position embeddings interpolated by the model.
+    """
+    if backend not in IMAGE_ENCODER_BACKENDS:
+        raise NotImplementedError(f'Image encoder backend {backend} not implemented.')
+    tower = ImageTower(model, image_size).eval()
+    if backend == 'torch':
+        return tower
+    # CPU backends work on a copy so the loaded model is left untouched
+    tower = copy.deepcopy(tower).cpu()
+    if backend == 'int8':
+        return torch.ao.quantization.quantize_dynamic(tower, {torch.nn.Linear}, dtype=torch.qint8)
+    suffix = f'_{image_size}' if image_size is not None else ''
+    onnx_path = os.path.join(onnx_dir or '.', f'{model_name.replace("/", "_")}{suffix}.onnx')
+    return OnnxImageTower(tower, onnx_path, quantize=(backend == 'onnx_int8'), num_threads=num_threads)
+
+
+def validation_key(model_name, backend, image_size=None):
+    return f"{model_name}|{backend}|{image_size or 'native'}"
+
+
+def record_validation(validation_path, model_name, backend, image_size, topk, agreements):
+    """Store the per-window top-K agreement of a backend against torch fp32 at native resolution."""
+    records = {}
+    if os.path.exists(validation_path):
+        with open(validation_path, 'r') as f:
+            records = json.load(f)
+    records[validation_key(model_name, backend, image_size)] = {
+        'topk': int(topk),
+        'windows': len(agreements),
+        'mean_agreement': float(np.mean(agreements)),
+        'min_agreement': float(np.min(agreements)),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(validation_path)), exist_ok=True)
+    with open(validation_path, 'w') as f:
+        json.dump(records, f, indent=2)
+
+
+def check_validated(validation_path, model_name, backend, image_size, topk, min_agreement=1.0):
+    """Raise unless the backend's top-K agreement was recorded by scripts/validate_key_frame_encoder.py.
+
+    Anything other than torch fp32 at native resolution can change which key frames are picked,
+    so it is only allowed once its worst window agreed on at least min_agreement of the top-K.
+    """
+    if backend == 'torch' and image_size is None:
+        return
+    key = validation_key(model_name, backend, image_size)
+    record = None
+    if validation_path is not None and os.path.exists(validation_path):
+        with open(validation_path, 'r') as f:
+            record = json.load(f).get(key)
+    if record is None:
+        raise ValueError(f"No recorded top-k agreement for {key} in {validation_path}, run scripts/validate_key_frame_encoder.py first")
+    if record['topk'] != topk or record['min_agreement'] < min_agreement:
+        raise ValueError(f"{key} was validated with top-{record['topk']} agreement {record['min_agreement']:.2f}, "
+                         f"top-{topk} agreement of at least {min_agreement:.2f} is required")
+
+
+def encode_images(encoder, pixel_values):
+    with torch.no_grad():
+        return encoder(encoder.resize(pixel_values))
+
+
+def topk_agreement(reference_scores, scores, topk):
+    """Fraction of the reference top-K frames that are also in the top-K of scores."""
+    reference_topk = set(np.argsort(-np.asarray(reference_scores), kind='stable')[:topk].tolist())
+    candidate_topk = set(np.argsort(-np.asarray(scores), kind='stable')[:topk].tolist())
+    return len(reference_topk & candidate_topk) / max(1, len(reference_topk))
+
+
+def time_encoder(encoder, pixel_values, batch_size=8, repeats=3):
+    """Mean seconds per frame for encoding pixel_values in mini-batches."""
+    encode_images(encoder, pixel_values[:batch_size]) # warm-up
+    start = time.time()
+    for _ in range(repeats):
+        for i in range(0, len(pixel_values), batch_size):
+            encode_images(encoder, pixel_values[i:i+batch_size])
+    return (time.time() - start) / (repeats * max(1, len(pixel_values)))
@@ -0,0 +1,227 @@
+import heapq, queue, threading
+import cv2
+import numpy as np
+
+
+def is_mostly_black(img_rgb, max_black_ratio=0.3):
+    black_pixels = np.sum(np.all(img_rgb == 0, axis=-1))
+    return black_pixels >= max_black_ratio * img_rgb.shape[0] * img_rgb.shape[1]
+
+
+def make_thumbnail(img, size=32):
+    return cv2.resize(np.ascontiguousarray(img), (size, size), interpolation=cv2.INTER_AREA)
+
+
+def perceptual_hash(gray_thumb, hash_size=8):
+    """64-bit DCT hash of a grayscale thumbnail, as a boolean array."""
+    dct = cv2.dct(np.float32(gray_thumb))[:hash_size, :hash_size]
+    coeffs = dct.flatten()[1:] # DC term only encodes brightness
+    return coeffs > np.median(coeffs)
+
+
+def pose_delta(pose_a, pose_b):
+    """Translation (m) and rotation (deg) between two 4x4 camera poses."""
+    translation = np.linalg.norm(pose_a[:3, 3] - pose_b[:3, 3])
+    cos_angle = (np.trace(pose_a[:3, :3].T @ pose_b[:3, :3]) - 1.) / 2.
+    return translation, np.degrees(np.arccos(np.clip(cos_angle, -1., 1.)))
+
+
+class FramePrefilter:
+    """Drops low-information and near-duplicate frames before they are embedded.
+
+    All checks run on small thumbnails. A frame is rejected if it is mostly
+    black, nearly textureless (e.g. facing a wall) or has a tiny depth range,
+    if the camera barely moved since the last kept frame, or if its perceptual
+    hash is within hash_distance bits of one of the last `history` kept frames.
+    """
+    def __init__(self, thumb_size=32, max_black_ratio=0.3, min_texture_std=6.0, min_depth_range=0.3,
+                 hash_distance=6, history=16, min_translation=0.1, min_rotation_deg=10.0):
+        self.thumb_size = thumb_size
+        self.max_black_ratio = max_black_ratio
+        self.min_texture_std = min_texture_std
+        self.min_depth_range = min_depth_range
+        self.hash_distance = hash_distance
+        self.history = history
+        self.min_translation = min_translation
+        self.min_rotation_deg = min_rotation_deg
+        self.reset()
+
+    def reset(self):
+        self._hashes = []
+        self._last_pose = None
+        self.num_seen = 0
+        self.num_kept = 0
+
+    def accept(self, img_rgb, depth=None, pose=None):
+        """Returns (keep, reason) and records the frame if it is kept."""
+        self.num_seen += 1
+        if img_rgb is None:
+            return False, 'missing'
+        if pose is not None and self._last_pose is not None:
+            translation, rotation = pose_delta(self._last_pose, pose)
+            if translation < self.min_translation and rotation < self.min_rotation_deg:
+                return False, 'static'
+
+        thumb = make_thumbnail(img_rgb, self.thumb_size)
+        if np.mean(np.all(thumb == 0, axis=-1)) >= self.max_black_ratio:
+            return False, 'black'
+        gray = cv2.cvtColor(thumb, cv2.COLOR_RGB2GRAY)
+        if gray.std() < self.min_texture_std:
+            return False, 'textureless'
+        if depth is not None:
+            depth_thumb = make_thumbnail(depth.astype(np.float32), self.thumb_size)
+            valid = depth_thumb[depth_thumb > 0]
+            if len(valid) == 0 or np.percentile(valid, 95) - np.percentile(valid, 5) < self.min_depth_range:
+                return False, 'flat_depth'
+
+        frame_hash = perceptual_hash(gray)
+        if any(np.count_nonzero(frame_hash != kept) <= self.hash_distance for kept in self._hashes):
+            return False, 'duplicate'
+
+        self._hashes = (self._hashes + [frame_hash])[-self.history:]
+        if pose is not None:
+            self._last_pose = pose
+        self.num_kept += 1
+        return True, 'novel'
+
+
+class StreamingKeyFrameSelector:
+    """Scores trajectory frames as they are rendered and keeps a running top-K.
+
+    Frames are filtered on arrival (by `prefilter` if given, otherwise black
+    frames and a fixed subsampling stride) and scored in mini-batches by
+    `score_fn` on a background worker, so the key frames are ready as soon as
+    the trajectory ends. Only the K best frames are retained. The worker is
+    started by the first queued frame, so callers that never stream frames
+    never start a thread.
+    """
+    def __init__(self, score_fn, topk, subsample_freq=1, batch_size=8, prefilter=None):
+        self._score_fn = score_fn
+        self._prefilter = prefilter
+        self._topk = topk
+        self._subsample_freq = subsample_freq
+        self._batch_size = batch_size
+        self._queue = queue.Queue()
+        self._worker = None
+        self.reset()
+
+    def reset(self):
+        self._queue.join()
+        self._heap = [] # (score, frame_idx, frame), smallest score on top
+        self._num_useful = 0
+        self.num_frames = 0
+        if self._prefilter is not None:
+            self._prefilter.reset()
+
+    def add_frame(self, img_rgb, depth=None, pose=None):
+        """Non-blocking: queue a rendered frame for scoring."""
+        self.num_frames += 1
+        if self._prefilter is not None:
+            if self._prefilter.accept(img_rgb, depth, pose)[0]:
+                self._put((self._num_useful, img_rgb))
+                self._num_useful += 1
+            return
+        if img_rgb is None or is_mostly_black(img_rgb):
+            return
+        if self._num_useful % self._subsample_freq == 0:
+            self._put((self._num_useful, img_rgb))
+        self._num_useful += 1
+
+    def _put(self, item):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+        self._queue.put(item)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+                self._queue.task_done()
+            try:
+                scores = self._score_fn([img for _, img in batch]) if len(batch) > 0 else []
+                for (frame_idx, img), score in zip(batch, scores):
+                    item = (float(score), frame_idx, img)
+                    if len(self._heap) < self._topk:
+                        heapq.heappush(self._heap, item)
+                    elif item[:2] > self._heap[0][:2]:
+                        heapq.heapreplace(self._heap, item)
+            except Exception as e:
+                print(f"Key frame scoring failed: {e!r}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def finish(self):
+        """Wait for queued frames and return [(score, frame)] best first."""
+        self._queue.join()
+        return [(score, img) for score, _, img in sorted(self._heap, key=lambda item: item[:2], reverse=True)]
+
+    def close(self):
+        """Stop the worker after the queued frames and drop the scoring function and retained frames."""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+        self._score_fn = None
+        self._heap = []
+
+
+def geometric_frame_scores(positions, half_sizes, weights, imgs_depth, intrinsics, extrinsics, depth_tolerance=0.3, max_depth=None):
+    """Score frames by the weighted count of scene graph objects visible in each view, without a neural network.
+
+    An object counts as visible in a frame if its bounding box centroid projects
+    inside the image in front of the camera, and the depth observed at that pixel
+    does not put a surface well in front of the box (occlusion check).
+
+    Args:
+        positions (ndarray): (M, 3) object centroids in the world frame.
+        half_sizes (ndarray): (M, 3) bounding box half sizes.
+        weights (ndarray): (M,) question relevance of each object; zero weights are skipped.
+        imgs_depth (list): N depth images in meters.
+        intrinsics (ndarray): (3, 3) shared camera matrix, or (N, 3, 3) per frame.
+        extrinsics (list): N (4, 4) camera-to-world poses (x right, y down, z forward).
+    Returns:
+        (N,) scores and the (N, M) visibility mask.
+    """
+    num_frames = len(imgs_depth)
+    keep = np.flatnonzero(np.asarray(weights) > 0)
+    visible = np.zeros((num_frames, len(weights)), dtype=bool)
+    if len(keep) == 0 or num_frames == 0:
+        return np.zeros(num_frames), visible
+    pts = np.asarray(positions, dtype=float).reshape(-1, 3)[keep]
+    radii = np.linalg.norm(np.asarray(half_sizes, dtype=float).reshape(-1, 3)[keep], axis=1)
+    intrinsics = np.asarray(intrinsics, dtype=float)
+
+    for i in range(num_frames):
+        depth = imgs_depth[i]
+        if depth is None or extrinsics[i] is None:
+            continue
+        intr = intrinsics[i] if intrinsics.ndim == 3 else intrinsics
+        pose = np.asarray(extrinsics[i], dtype=float)
+        cam_pts = (pts - pose[:3, 3]) @ pose[:3, :3] # world -> camera
+        z = cam_pts[:, 2]
+        in_front = z > 1e-3
+        if max_depth is not None:
+            in_front &= z - radii <= max_depth
+        z_safe = np.where(in_front, z, 1.)
+        u = np.round(cam_pts[:, 0] * intr[0, 0] / z_safe + intr[0, 2]).astype(np.int64)
+        v = np.round(cam_pts[:, 1] * intr[1, 1] / z_safe + intr[1, 2]).astype(np.int64)
+        im_h, im_w = depth.shape[:2]
+        in_view = in_front & (u >= 0) & (u < im_w) & (v >= 0) & (v < im_h)
+        observed = depth[np.clip(v, 0, im_h - 1), np.clip(u, 0, im_w - 1)]
+        # Missing depth (0) can't occlude; otherwise the observed surface must not be well in front of the box
+        unoccluded = (observed <= 0) | (observed >= z - radii - depth_tolerance)
+        visible[i, keep] = in_view & unoccluded
+
+    scores = visible.astype(float) @ np.asarray(weights, dtype=float)
+    return scores, visible
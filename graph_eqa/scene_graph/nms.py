@@ -0,0 +1,66 @@
+import numpy as np
+from numba import njit
+
+
+@njit
+def _grid_nms_kernel(positions, cells, dims, cell_keys, cell_idx, order, threshold_sq):
+    # Kept points are chained per grid cell: head[cell] -> next_kept[point] -> ...
+    head = np.full(len(cell_keys), -1, dtype=np.int64)
+    next_kept = np.full(len(positions), -1, dtype=np.int64)
+    keep = np.empty(len(order), dtype=np.int64)
+    num_keep = 0
+    for i in order:
+        suppressed = False
+        for dx in range(-1, 2):
+            for dy in range(-1, 2):
+                for dz in range(-1, 2):
+                    key = ((cells[i, 0] + dx) * dims[1] + cells[i, 1] + dy) * dims[2] + cells[i, 2] + dz
+                    c = np.searchsorted(cell_keys, key)
+                    if c == len(cell_keys) or cell_keys[c] != key:
+                        continue
+                    j = head[c]
+                    while j >= 0 and not suppressed:
+                        dist_sq = 0.0
+                        for k in range(positions.shape[1]):
+                            dist_sq += (positions[i, k] - positions[j, k]) ** 2
+                        suppressed = dist_sq < threshold_sq
+                        j = next_kept[j]
+                    if suppressed:
+                        break
+                if suppressed:
+                    break
+            if suppressed:
+                break
+        if not suppressed:
+            keep[num_keep] = i
+            num_keep += 1
+            next_kept[i] = head[cell_idx[i]]
+            head[cell_idx[i]] = i
+    return keep[:num_keep]
+
+
+def grid_nms(positions, scores, threshold):
+    """
+    Greedy non-maximum suppression of points: in descending score order, keep a
+    point unless it is closer than threshold to an already kept point.
+    Points are bucketed into grid cells slightly larger than threshold so only
+    the 3^D neighbouring cells are checked, which is linear in the number of points.
+    positions: [N, D] array with D <= 3
+    scores: [N] array
+    Returns the kept indices, highest score first (ties in input order).
+    """
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+    if len(order) == 0 or threshold <= 0:
+        return order
+    positions = np.asarray(positions, dtype=np.float64).reshape(len(order), -1)
+    padded = np.zeros((len(positions), 3))
+    padded[:, :positions.shape[1]] = positions
+    # With cells exactly threshold wide, rounding in the division can put two points
+    # closer than threshold two cells apart, the margin keeps them in neighbouring cells
+    cell_size = threshold * (1 + 1e-6)
+    # Shift cells by one so neighbours of valid cells never alias another cell's key
+    cells = np.floor((padded - padded.min(axis=0)) / cell_size).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    cell_keys, cell_idx = np.unique(keys, return_inverse=True)
+    return _grid_nms_kernel(positions, cells, dims, cell_keys, cell_idx.reshape(-1), order, float(threshold) ** 2)
@@ -0,0 +1,101 @@
+import re
+
+import numpy as np
+
+from graph_eqa.scene_graph.graph_store import NODE_TYPES
+from graph_eqa.scene_graph.serialization import serialize_scene_graph, estimate_tokens
+
+
+def hierarchical_parents(graph, nodeid):
+    layer = graph.layer_of(nodeid)
+    return [parent for parent in graph.predecessors(nodeid) if graph.layer_of(parent) > layer and 'frontier' not in parent]
+
+
+def hierarchical_ancestors(graph, nodeid):
+    ancestors, stack = set(), [nodeid]
+    while len(stack) > 0:
+        for parent in hierarchical_parents(graph, stack.pop()):
+            if parent not in ancestors:
+                ancestors.add(parent)
+                stack.append(parent)
+    return ancestors
+
+
+def hierarchical_descendants(graph, nodeids):
+    """Nodes below any of nodeids (inclusive) along parent -> child edges, the inverse of hierarchical_parents."""
+    descendants = set(nodeid for nodeid in nodeids if graph.has_node(nodeid))
+    stack = list(descendants)
+    while len(stack) > 0:
+        nodeid = stack.pop()
+        if 'frontier' in nodeid:
+            continue
+        layer = graph.layer_of(nodeid)
+        for child in graph.successors(nodeid):
+            if child not in descendants and graph.layer_of(child) < layer:
+                descendants.add(child)
+                stack.append(child)
+    return descendants
+
+
+def hierarchical_closure(graph, nodeids):
+    """Row mask of nodeids and all their hierarchical ancestors, propagated a layer at a time over the edge columns."""
+    edge_rows = graph.ordered_rows()[1]
+    sources, targets = graph.edge_source[edge_rows], graph.edge_target[edge_rows]
+    layers = np.maximum(graph.layer, 0)
+    up = (layers[sources] > layers[targets]) & (graph.node_type[sources] != NODE_TYPES.index('frontier'))
+    sources, targets = sources[up], targets[up]
+    closure = np.zeros(len(graph.node_alive), dtype=bool)
+    closure[[graph.row(nodeid) for nodeid in nodeids]] = True
+    while True:
+        parents = sources[closure[targets] & ~closure[sources]]
+        if len(parents) == 0:
+            return closure
+        closure[parents] = True
+
+
+def lexical_similarity(names, query):
+    """Fraction of each name's words that appear in the query, used when no text encoder is loaded."""
+    query_words = set(re.findall(r"[a-z]+", query.lower()))
+    sims = []
+    for name in names:
+        words = re.findall(r"[a-z]+", str(name).lower())
+        sims.append(np.mean([word in query_words for word in words]) if len(words) > 0 else 0.)
+    return np.array(sims, dtype=float)
+
+
+def _zscore(values):
+    values = np.asarray(values, dtype=float)
+    std = values.std()
+    return (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+
+
+def rank_by_relevance(similarity, hops, distance_weight=0.5):
+    """Indices sorted by question similarity, penalized by hop distance to the agent (both z-scored)."""
+    hops = np.asarray(hops, dtype=float)
+    if len(hops) > 0 and np.isinf(hops).any():
+        finite = hops[np.isfinite(hops)]
+        hops[np.isinf(hops)] = (finite.max() if len(finite) > 0 else 0.) + 1.
+    score = _zscore(similarity) - distance_weight * _zscore(hops)
+    return np.argsort(-score, kind='stable')
+
+
+def budgeted_subgraph(graph, ranked_ids, keep_ids, token_budget, fmt='node_link', precision=2):
+    """Largest prefix of ranked_ids (plus keep_ids and all their ancestors) whose serialization fits the budget."""
+    def subgraph_for(num_ranked):
+        closure = hierarchical_closure(graph, list(keep_ids) + list(ranked_ids[:num_ranked]))
+        return graph.subgraph(graph.node_ids_at(np.flatnonzero(closure)))
+
+    def fits(num_ranked):
+        return estimate_tokens(serialize_scene_graph(subgraph_for(num_ranked), fmt, precision)) <= token_budget
+
+    # Serialized size grows with the prefix, so bisect on its length
+    low, high = 0, len(ranked_ids)
+    if fits(high):
+        return subgraph_for(high)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return subgraph_for(low)
@@ -0,0 +1,95 @@
+import re, json
+from collections import defaultdict
+
+import numpy as np
+
+# Typical objects per room, used as pseudo-counts before any logged data is seen
+ROOM_PROTOTYPES = {
+    "bedroom": ["bed", "pillow", "nightstand", "bedside lamp", "wardrobe", "chest of drawers", "cuddly toy", "doll", "dresser", "blanket"],
+    "bathroom": ["toilet", "sink", "bathtub", "shower cabin", "shower rail", "bidet", "faucet", "towel", "toilet brush", "toilet paper dispenser", "bathroom cabinet", "cosmetics", "mirror"],
+    "living room": ["sofa", "l-shaped sofa", "couch", "coffee table", "tv", "tv stand", "fireplace", "armchair", "rug", "pillow", "decorative plant"],
+    "kitchen": ["refrigerator", "oven", "microwave", "stove", "kitchen cabinet", "kitchen countertop item", "kitchen utensil", "kitchen extractor", "paper towel dispenser", "dishwasher", "sink", "countertop"],
+    "lobby": ["coat rack", "door", "bench", "shoe rack", "umbrella stand", "plant", "mirror"],
+    "dining room": ["dining table", "dining chair", "dinner table", "dinner chair", "table cloth", "chandelier", "bouquet", "flower vase"],
+    "patio": ["outdoor chair", "outdoor table", "umbrella", "grill", "plant", "lounge chair"],
+    "closet": ["wardrobe", "hanger", "clothes", "shoe", "shelf", "bag", "laundry basket"],
+    "study room": ["desk", "bookshelf", "book", "office chair", "table lamp", "computer"],
+    "staircase": ["stairs", "stair", "railing", "banister", "handrail"],
+    "porch": ["door", "bench", "plant", "doormat", "outdoor chair"],
+    "laboratory": ["lab bench", "microscope", "beaker", "fume hood", "test tube"],
+    "office": ["desk", "office chair", "computer", "monitor", "keyboard", "printer", "filing cabinet", "whiteboard", "telephone"],
+    "workshop": ["workbench", "tool", "toolbox", "drill", "saw", "vise"],
+    "garage": ["car", "bicycle", "tool", "washing machine", "shelf", "storage box", "fuse box"],
+}
+
+
+def _tokens(object_name):
+    # Whole names plus their words, so 'kitchen cabinet' also supports 'cabinet'
+    name = str(object_name).lower().strip()
+    words = [word for word in re.split(r"[^a-z]+", name) if word]
+    return [name] + words if len(words) > 1 else words
+
+
+class CooccurrenceRoomClassifier:
+    """Multinomial naive-Bayes room classifier over object-name tokens.
+
+    Seeded with ROOM_PROTOTYPES and refined with (object names, room label)
+    pairs, e.g. the gpt-4o-mini labels logged by RoomLabelCache. Runs on CPU in
+    well under a millisecond and is deterministic.
+    """
+    def __init__(self, room_labels, prototype_weight=1.0, smoothing=0.1):
+        self.room_labels = list(room_labels)
+        self._smoothing = smoothing
+        self._counts = {room: defaultdict(float) for room in self.room_labels}
+        self._room_examples = defaultdict(float)
+        for room, objects in ROOM_PROTOTYPES.items():
+            if room in self._counts:
+                self.fit_one(objects, room, weight=prototype_weight)
+
+    def fit_one(self, object_names, room_label, weight=1.0):
+        if room_label not in self._counts:
+            return
+        for object_name in object_names:
+            for token in _tokens(object_name):
+                self._counts[room_label][token] += weight
+        self._room_examples[room_label] += weight
+
+    def fit(self, labelled_examples):
+        for object_names, room_label in labelled_examples:
+            self.fit_one(object_names, room_label)
+        return self
+
+    def scores(self, object_names):
+        vocab = set(token for counts in self._counts.values() for token in counts)
+        tokens = [token for object_name in object_names for token in _tokens(object_name) if token in vocab]
+        total_examples = sum(self._room_examples.values())
+        scores = np.empty(len(self.room_labels))
+        for i, room in enumerate(self.room_labels):
+            counts = self._counts[room]
+            denom = sum(counts.values()) + self._smoothing * len(vocab)
+            prior = (self._room_examples[room] + 1.0) / (total_examples + len(self.room_labels))
+            scores[i] = np.log(prior) + sum(np.log((counts.get(token, 0.0) + self._smoothing) / denom) for token in tokens)
+        return scores
+
+    def classify(self, object_names):
+        """Returns the most likely room label and the object tokens that supported it."""
+        scores = self.scores(object_names)
+        room_label = self.room_labels[int(np.argmax(scores))]
+        evidence = sorted(set(token for object_name in object_names for token in _tokens(object_name) if token in self._counts[room_label]))
+        return room_label, evidence
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({
+                "counts": {room: dict(counts) for room, counts in self._counts.items()},
+                "room_examples": dict(self._room_examples),
+            }, f, indent=4)
+
+    def load(self, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        for room, counts in data["counts"].items():
+            if room in self._counts:
+                self._counts[room] = defaultdict(float, counts)
+        self._room_examples = defaultdict(float, data["room_examples"])
+        return self
@@ -0,0 +1,67 @@
+import os, json, hashlib, sqlite3
+from collections import OrderedDict
+
+
+class RoomLabelCache:
+    """Room labels keyed on a hash of the room's unique object names.
+
+    Hits are served from an in-memory LRU and fall back to an optional SQLite
+    file, so labels are shared across episodes and scenes of an experiment.
+    """
+    def __init__(self, db_path=None, max_size=1024):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._db = None
+        if db_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), timeout=30)
+            self._db.execute("CREATE TABLE IF NOT EXISTS room_labels (key TEXT PRIMARY KEY, label TEXT NOT NULL, object_names TEXT)")
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(room_labels)")]
+            if 'object_names' not in columns:
+                self._db.execute("ALTER TABLE room_labels ADD COLUMN object_names TEXT")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(object_names, model=''):
+        names = sorted(set(str(name) for name in object_names))
+        return hashlib.sha1(json.dumps([model, names]).encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _put_memory(self, key, label):
+        self._entries[key] = label
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self._db is not None:
+            row = self._db.execute("SELECT label FROM room_labels WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._put_memory(key, row[0])
+                return row[0]
+        return None
+
+    def put(self, key, label, object_names=None):
+        self._put_memory(key, label)
+        if self._db is not None:
+            if object_names is not None:
+                object_names = json.dumps(sorted(set(str(name) for name in object_names)))
+            self._db.execute("INSERT OR REPLACE INTO room_labels (key, label, object_names) VALUES (?, ?, ?)", (key, label, object_names))
+            self._db.commit()
+
+    def labelled_examples(self):
+        """(object names, label) pairs logged on disk, e.g. to train an offline room classifier."""
+        if self._db is None:
+            return []
+        rows = self._db.execute("SELECT object_names, label FROM room_labels WHERE object_names IS NOT NULL").fetchall()
+        return [(json.loads(object_names), label) for object_names, label in rows]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
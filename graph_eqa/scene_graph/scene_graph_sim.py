@@ -1,19 +1,40 @@
-import json, time, os
+import json, time, os, asyncio, logging
 import numpy as np
-import networkx as nx
-from networkx.readwrite import json_graph
-from itertools import chain
+from itertools import chain, compress
+from collections import defaultdict, deque
 import torch
 import imageio, cv2
 from PIL import Image
-import rerun as rr
 
 from enum import Enum
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+from graph_eqa.scene_graph.room_label_cache import RoomLabelCache
+from graph_eqa.scene_graph.room_classifier import CooccurrenceRoomClassifier
+from graph_eqa.scene_graph.serialization import serialize_scene_graph, estimate_tokens
+from graph_eqa.scene_graph.image_encoders import build_image_encoder, check_validated, encode_images
+from graph_eqa.scene_graph.key_frames import FramePrefilter, StreamingKeyFrameSelector, geometric_frame_scores, is_mostly_black
+from graph_eqa.scene_graph.relevance import budgeted_subgraph, hierarchical_descendants, lexical_similarity, rank_by_relevance
+from graph_eqa.scene_graph.graph_store import NODE_TYPES, SceneGraphStore
+from graph_eqa.scene_graph.hydra_export import CATEGORY_TYPES, HydraNodeColumns, diff_node_tables, export_graph_nodes
+from graph_eqa.scene_graph.spatial_index import SceneGraphSpatialIndex
 
 client = OpenAI()
 
+
+def _event_loop_running():
+    # asyncio.run cannot be nested, callers already inside an event loop get the synchronous client
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+# One shared string per edge type instead of one per edge
+EDGE_TYPES = {(source_type, target_type): f'{source_type}-to-{target_type}' for source_type in NODE_TYPES for target_type in NODE_TYPES}
+
 class Rooms(str, Enum):
     bedroom = "bedroom"
     bathroom = "bathroom"
@@ -61,6 +82,56 @@ class SceneGraphSim:
 
         self.filter_out_objects = ['floor', 'ceiling', '.']
 
+        # Keep the Hydra-derived graph alive across updates and only apply what changed
+        self.incremental_update = self.sg_cfg.get('incremental_update', False)
+        self._reset_hydra_cache()
+
+        # Room labels keyed on each room's object set, shared across episodes through an on-disk store
+        self.room_label_model = "gpt-4o-mini"
+        self.room_label_cache = None
+        if self.enrich_rooms:
+            room_label_cache_path = self.sg_cfg.get('room_label_cache_path', None)
+            if room_label_cache_path is None:
+                room_label_cache_path = output_path.parent / "room_label_cache.sqlite"
+            self.room_label_cache = RoomLabelCache(room_label_cache_path, max_size=self.sg_cfg.get('room_label_cache_size', 1024))
+
+        # 'openai' queries gpt-4o-mini, 'local' uses an offline co-occurrence classifier trained from the logged labels
+        self.room_label_backend = self.sg_cfg.get('room_label_backend', 'openai')
+        if self.enrich_rooms and self.room_label_backend == 'local':
+            self.room_classifier = CooccurrenceRoomClassifier([room.value for room in Rooms])
+            room_classifier_path = self.sg_cfg.get('room_classifier_path', None)
+            if room_classifier_path is not None and os.path.exists(room_classifier_path):
+                self.room_classifier.load(room_classifier_path)
+            else:
+                self.room_classifier.fit(self.room_label_cache.labelled_examples())
+
+        # Rooms that miss the cache can be classified concurrently instead of one blocking call at a time
+        self.async_room_enrichment = self.sg_cfg.get('async_room_enrichment', False)
+        self.room_enrichment_concurrency = self.sg_cfg.get('room_enrichment_concurrency', 8)
+        self.room_enrichment_timeout = self.sg_cfg.get('room_enrichment_timeout', 10.0)
+        self.room_enrichment_fallback = self.sg_cfg.get('room_enrichment_fallback', 'room')
+
+        # 'node_link' is the full networkx json, 'compact' nests children under parents and rounds positions
+        self.scene_graph_format = self.sg_cfg.get('scene_graph_format', 'node_link')
+        self.scene_graph_precision = self.sg_cfg.get('scene_graph_precision', 2)
+        self._scene_graph_str = None
+
+        # Planner prompts can be limited to a question-relevant subgraph that fits a token budget
+        self.clean_ques_ans = clean_ques_ans
+        self.prompt_token_budget = self.sg_cfg.get('prompt_token_budget', None)
+        self.relevance_distance_weight = self.sg_cfg.get('relevance_distance_weight', 0.5)
+        self._text_embeds = {}
+
+        # Only the newest agent pose (plus an optional decimated history) is mirrored from the dynamic layers
+        self.agent_pose_history = self.sg_cfg.get('agent_pose_history', 0)
+        self.agent_pose_stride = max(1, self.sg_cfg.get('agent_pose_stride', 1))
+        self._latest_agent_key = None
+        self._agent_history_keys = deque(maxlen=self.agent_pose_history) if self.agent_pose_history > 0 else None
+
+        # Object positions / boxes and room membership, refreshed on every scene graph build
+        self.spatial_index = SceneGraphSpatialIndex()
+
+        self.model, self.processor = None, None
         if self.sg_cfg.key_frame_selection.use_clip_for_images:
             from transformers import CLIPProcessor, CLIPModel
             self.model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(device)
@@ -85,16 +156,61 @@ class SceneGraphSim:
             self.question_embed = self.question_embed_labels.copy() 
             self.question_embed['input_ids'] = ((self.question_embed_labels['input_ids']+self.question_embed_exist['input_ids'])/2.0).to(self.question_embed_labels['input_ids'].dtype)
 
+        # The question text is fixed for the episode, so its features are computed once
+        self.key_frame_selector, self.frame_prefilter = None, None
+        if self.model is not None:
+            with torch.no_grad():
+                self._question_text_features = torch.nn.functional.normalize(self.model.get_text_features(**self.question_embed_labels), dim=-1)
+            # Optional int8 / ONNX Runtime image tower for CPU-only hosts
+            kf_cfg = self.sg_cfg.key_frame_selection
+            image_backend, image_size = kf_cfg.get('image_backend', 'torch'), kf_cfg.get('image_size', None)
+            check_validated(kf_cfg.get('image_backend_validation', None), self.model.config.name_or_path, image_backend, image_size,
+                            kf_cfg.topk, min_agreement=kf_cfg.get('min_topk_agreement', 1.0))
+            self.image_encoder = build_image_encoder(
+                self.model,
+                backend=image_backend,
+                image_size=image_size,
+                onnx_dir=kf_cfg.get('onnx_dir', None) or str(self.output_path.parent),
+                model_name=self.model.config.name_or_path,
+            )
+            # Thumbnail pre-filter so only novel, informative frames reach the image tower
+            prefilter_cfg = kf_cfg.get('prefilter', None)
+            if prefilter_cfg is not None and prefilter_cfg.get('enabled', False):
+                self.frame_prefilter = FramePrefilter(**{k: v for k, v in prefilter_cfg.items() if k != 'enabled'})
+            if kf_cfg.get('streaming', False):
+                self.key_frame_selector = StreamingKeyFrameSelector(
+                    self._frame_logits,
+                    topk=kf_cfg.topk,
+                    subsample_freq=self.sg_cfg.img_subsample_freq,
+                    batch_size=kf_cfg.get('streaming_batch_size', 8),
+                    prefilter=self.frame_prefilter,
+                )
+
             
     def _load_scene_graph(self):
+        from networkx.readwrite import json_graph
+
         with open(self._sg_path, "r") as f:
             self.scene_graph = json.load(f)
         self.netx_sg = json_graph.node_link_graph(self.scene_graph)
                 
     @property
     def scene_graph_str(self):
-        return json.dumps(nx.node_link_data(self.filtered_netx_graph))
+        # Memoized until the next update changes the graph
+        if self._scene_graph_str is None:
+            self._scene_graph_str = serialize_scene_graph(self.get_relevant_subgraph(), fmt=self.scene_graph_format, precision=self.scene_graph_precision)
+            logging.debug(f"Scene graph prompt size ({self.scene_graph_format}): {len(self._scene_graph_str)} chars, ~{estimate_tokens(self._scene_graph_str)} tokens")
+        return self._scene_graph_str
+
+    @property
+    def scene_graph_size(self):
+        return {'chars': len(self.scene_graph_str), 'tokens': estimate_tokens(self.scene_graph_str)}
     
+    @property
+    def filtered_netx_graph(self):
+        # NetworkX export of the columnar store, built on every access: prompts and queries read the store directly
+        return self.filtered_graph.to_networkx()
+
     @property
     def room_node_ids(self):
         return self._room_ids
@@ -128,266 +244,442 @@ class SceneGraphSim:
         return np.logical_and(in_plane, nearby)
 
 
-    def _build_sg_from_hydra_graph(self):
-        self.filtered_netx_graph = nx.DiGraph()
-
-        self._room_ids, self._region_node_ids, self._frontier_node_ids, self._object_node_ids, self._object_node_names = [], [], [], [], []
-
-        # Clear all objects from a specific namespace
-        if self.rr_logger is not None:
-            self.rr_logger.log_clear("world/hydra_graph")
-            self.rr_logger.log_clear("/world/annotations/bb")
-        
-        agent_ids, agent_cat_ids = [], []
-        for layer in self.pipeline.graph.dynamic_layers:
-            for node in layer.nodes:
-                if 'a' in node.id.category.lower():
-                    attr={}
-                    nodeid, node_type, node_name = self._get_node_properties(node)
-                    agent_cat_ids.append(int(node.id.category_id))
-                    agent_ids.append(nodeid)
-
-                    attr['position'] = list(node.attributes.position)
-                    attr['name'] = node_name
-                    attr['layer'] = node.layer
-                    attr['timestamp'] = float(node.timestamp/1e8)
-                    self.filtered_netx_graph.add_nodes_from([(nodeid, attr)])
-                    if self.rr_logger is not None:
-                        self.rr_logger.log_hydra_graph(is_node=True, nodeid=nodeid, node_type=node_type, node_pos_source=np.array(node.attributes.position))
-        
-        if len(agent_cat_ids) > 0:
-            self.curr_agent_id = agent_ids[np.argmax(agent_cat_ids)]
-            self.curr_agent_pos = self.get_position_from_id(self.curr_agent_id)
-        
-        object_node_positions, bb_half_sizes, bb_centroids, bb_mat3x3, bb_labels, bb_colors = [], [], [], [], [], []
-        self.filtered_obj_positions, self.filtered_obj_ids = [], []
-        ## Adding other nodes
-        
-        for node in self.pipeline.graph.nodes:
+    def _reset_hydra_cache(self):
+        # Types logged from the previous mirror stay dirty, so the rerun batch of a type that disappears is cleared
+        previous = getattr(self, '_hydra_table', None)
+        self._rr_node_types = getattr(self, '_rr_node_types', set()) | (set(NODE_TYPES[code] for code in np.unique(previous.node_types).tolist()) if previous is not None else set())
+        self._rr_edge_types = getattr(self, '_rr_edge_types', set()) | set(edge_type for edge_type in getattr(self, '_hydra_edges', {}).values() if edge_type is not None)
+        self._rr_frontier_edges = [], [] # frontier-to-object source and target positions
+
+        # Persistent mirror of the filtered Hydra graph, kept alive across updates in incremental mode
+        self._hydra_graph = SceneGraphStore()
+        self._hydra_edges = {} # (hydra source id, hydra target id) -> edge type, None if filtered out
+        self._hydra_table = None # node table of the previous sync, for change detection and hydra id lookups
+        # Agent and object columns in Hydra key order, only touched for nodes that changed
+        self._hydra_agents = HydraNodeColumns(nodeid=(object, ()), category_id=(np.int64, ()))
+        self._hydra_objects = HydraNodeColumns( # every object, filtered or not, for the box annotations
+            nodeid=(object, ()), name=(object, ()), filtered=(bool, ()), position=(float, (3,)),
+            half_size=(float, (3,)), centroid=(float, (3,)), mat3x3=(float, (3, 3)), color=(np.uint8, (3,)))
+        # Nodes that changed and roots of subtrees that were re-parented, re-located in the room index on the next build
+        self._room_index_nodes, self._room_index_subtrees = set(), set()
+        self._room_index_stale = True
+
+    def _edge_endpoints(self, keys):
+        """(source, target) of Hydra edge keys as (nodeid, node type, node name), None for endpoints not in the current Hydra graph."""
+        table = self._hydra_table
+        idx = table.lookup(np.array(keys, dtype=np.uint64).reshape(-1))
+        found = np.flatnonzero(idx >= 0)
+        endpoints = [None] * len(idx)
+        node_types = [NODE_TYPES[code] for code in table.node_types[idx[found]].tolist()]
+        for j, endpoint in zip(found.tolist(), zip(table.node_ids(idx[found]), node_types, table.node_names(idx[found]))):
+            endpoints[j] = endpoint
+        return list(zip(endpoints[::2], endpoints[1::2]))
+
+    def _edge_type(self, source, target):
+        """Type of a Hydra edge between (nodeid, node type, node name) endpoints, None if it is filtered out."""
+        _, source_type, source_name = source
+        _, target_type, target_name = target
+
+        # Filtering scene graph
+        if source_name in self.filter_out_objects or target_name in self.filter_out_objects:
+            return None
+        # if 'object' in source_type and 'object' in target_type: # Object->Object
+        #     return None
+        if 'region' in source_type and 'region' in target_type: # Place->Place
+            return None
+        if 'frontier' in source_type or 'frontier' in target_type: # ALL FRONTIERS for now, we add frontiers later
+            return None
+        if 'agent' in source_type and 'agent' in target_type: # agent->agent
+            return None
+
+        return EDGE_TYPES[source_type, target_type]
+
+    def _flush_hydra_graph_log(self):
+        """Re-log the node and edge types that changed since the last flush, one batch per type."""
+        # Types stay dirty while the logger skips the graph, so the next kept frame catches up
+        if self.rr_logger is None or not self.rr_logger.enabled("world/hydra_graph"):
+            return
+        table = self._hydra_table
+        for node_type in self._rr_node_types:
+            idx = np.flatnonzero(table.node_types == NODE_TYPES.index(node_type))
+            self.rr_logger.log_hydra_nodes(node_type, table.positions[idx], table.node_ids(idx))
+        if len(self._rr_edge_types) > 0:
+            edges = defaultdict(list)
+            for key, edge_type in self._hydra_edges.items():
+                if edge_type in self._rr_edge_types:
+                    edges[edge_type].append(key)
+            for edge_type in self._rr_edge_types:
+                idx = table.lookup(np.array(edges[edge_type], dtype=np.uint64).reshape(-1)).reshape(-1, 2)
+                idx = idx[(idx >= 0).all(axis=1)]
+                self.rr_logger.log_hydra_edges(edge_type, table.positions[idx[:, 0]], table.positions[idx[:, 1]])
+        self.rr_logger.log_hydra_edges('frontier-to-object', *self._rr_frontier_edges)
+        self._rr_node_types, self._rr_edge_types = set(), set()
+
+    def _sync_hydra_nodes(self, table):
+        """Apply added, changed and removed Hydra nodes (a HydraNodeTable) to the mirror graph.
+
+        Returns the hydra ids of nodes that changed or disappeared, so their incident edges can be re-evaluated.
+        """
+        changed_mask, removed_mask = diff_node_tables(table, self._hydra_table)
+        previous, self._hydra_table = self._hydra_table, table
+        changed = np.flatnonzero(changed_mask)
+        objects, agents = defaultdict(list), []
+        for i, nodeid, node_name in zip(changed.tolist(), table.node_ids(changed), table.node_names(changed)):
+            node, node_type = table.nodes[i], table.node_type(i)
             attr={}
-            nodeid, node_type, node_name = self._get_node_properties(node)
-            attr['position'] = list(node.attributes.position)
+            attr['position'] = table.positions[i]
             attr['name'] = node_name
             attr['layer'] = node.layer
-            if self.rr_logger is not None:
-                self.rr_logger.log_hydra_graph(is_node=True, nodeid=nodeid, node_type=node_type, node_pos_source=np.array(node.attributes.position))
-
-            if node.id.category.lower() in ['o', 'r', 'b']:
+            if node_type == 'agent':
+                attr['timestamp'] = float(node.timestamp/1e8)
+                agents.append(i)
+            if node_type in ['object', 'room', 'building']:
                 attr['label'] = node.attributes.semantic_label
-            
-            # Filtering
-            if 'o' in node.id.category.lower():
-                object_node_positions.append(node.attributes.position)
+            self._room_index_nodes.add(nodeid)
+            self._rr_node_types.add(node_type)
+
+            bbox_half_size = None
+            if node_type == 'object':
                 bbox = node.attributes.bounding_box
-                bb_half_sizes.append(0.5 * bbox.dimensions)
-                bb_centroids.append(bbox.world_P_center)
-                bb_mat3x3.append(bbox.world_R_center)
-                bb_labels.append(node.attributes.name)
-                bb_colors.append(node.attributes.color)
-                
-                if node_name in self.filter_out_objects:
+                bbox_half_size = 0.5 * bbox.dimensions
+                filtered = node_name in self.filter_out_objects
+                for column, value in (('index', i), ('nodeid', nodeid), ('name', node_name), ('filtered', filtered), ('half_size', bbox_half_size),
+                                      ('centroid', bbox.world_P_center), ('mat3x3', bbox.world_R_center), ('color', node.attributes.color)):
+                    objects[column].append(value)
+                if filtered:
+                    self._hydra_graph.remove_node(nodeid)
                     continue
-                self.filtered_obj_positions.append(node.attributes.position)
-                self.filtered_obj_ids.append(nodeid)
-                self._object_node_ids.append(nodeid)
-                self._object_node_names.append(node_name)
-
-            if 'p' in node.id.category.lower():
-                self._region_node_ids.append(nodeid)
-
-            # if 'f' in node.id.category.lower():
-            #     if self.is_relevant_frontier(np.array(attr['position']), self.curr_agent_pos)[0]:
-            #         # self.rr_logger.log_hydra_graph(is_node=True, nodeid=nodeid, node_type='frontier_selected', node_pos_source=node.attributes.position)
-            #         self._frontier_node_ids.append(nodeid)
-            #         # DONT ADD FRONTIER OR PLACE NODES
-            #         continue
-            
-            if 'r' in node.id.category.lower():
-                self._room_ids.append(nodeid)
-            
-            self.filtered_netx_graph.add_nodes_from([(nodeid, attr)])
-        
+            # Agents first, then layer by layer in Hydra's key order, as the full graph lists them
+            sort_key = (0 if node_type == 'agent' else 1 + int(node.layer), int(table.keys[i]))
+            self._hydra_graph.add_node(nodeid, attr, bbox_half_size=bbox_half_size, sort_key=sort_key)
+
+        if len(agents) > 0:
+            self._hydra_agents.update(table.keys[agents], nodeid=table.node_ids(agents), category_id=table.category_ids[agents])
+        if len(objects) > 0:
+            index = objects.pop('index')
+            self._hydra_objects.update(table.keys[index], position=table.positions[index], **objects)
+
+        removed = np.flatnonzero(removed_mask)
+        if len(removed) == 0:
+            return table.keys[changed]
+        removed_keys, removed_ids = previous.keys[removed], previous.node_ids(removed)
+        self._hydra_agents.discard(removed_keys)
+        self._hydra_objects.discard(removed_keys)
+        self._room_index_nodes.update(removed_ids)
+        self._hydra_graph.remove_nodes_from(removed_ids)
+        self._rr_node_types.update(NODE_TYPES[code] for code in previous.node_types[removed].tolist())
+        return np.concatenate([table.keys[changed], removed_keys])
+
+    def _remove_hydra_edge(self, key, source, target):
+        """Drop a mirrored Hydra edge, returning its edge type (None if it was filtered out)."""
+        edge_type = self._hydra_edges.pop(key)
+        if edge_type is not None:
+            # Edges of nodes that left Hydra or got filtered out already went with the node
+            if source is not None and target is not None and self._hydra_graph.has_edge(source[0], target[0]):
+                self._hydra_graph.remove_edge(source[0], target[0])
+            self._rr_edge_types.add(edge_type)
+        return edge_type
+
+    def _sync_hydra_edges(self, edge_keys, dirty_nodes):
+        """Apply added and removed Hydra edges, and re-evaluate edges touching changed nodes."""
+        current = set(edge_keys)
+
+        removed = list(self._hydra_edges.keys() - current)
+        for key, (source, target) in zip(removed, self._edge_endpoints(removed)):
+            if self._remove_hydra_edge(key, source, target) is not None and target is not None:
+                self._room_index_subtrees.add(target[0])
+
+        dirty = current - self._hydra_edges.keys()
+        if len(dirty_nodes) > 0 and len(current) > 0:
+            current = list(current)
+            touched = np.isin(np.array(current, dtype=np.uint64), dirty_nodes).any(axis=1)
+            dirty.update(compress(current, touched.tolist()))
+
+        dirty = list(dirty)
+        for key, (source, target) in zip(dirty, self._edge_endpoints(dirty)):
+            old_edge_type = self._remove_hydra_edge(key, source, target) if key in self._hydra_edges else None
+            edge_type = None
+            if source is not None and target is not None:
+                edge_type = self._edge_type(source, target)
+                self._hydra_edges[key] = edge_type
+                if edge_type is not None:
+                    self._rr_edge_types.add(edge_type)
+                    edge_attr = {'source_name': source[2], 'target_name': target[2], 'type': edge_type}
+                    # Children in key order, agent poses after the static nodes as their edges come last in Hydra
+                    self._hydra_graph.add_edge(source[0], target[0], edge_attr, sort_key=(int(target[1] == 'agent'), key[1]))
+            # An edge that appeared or disappeared may move the target's subtree to another room
+            if (old_edge_type is None) != (edge_type is None) and target is not None:
+                self._room_index_subtrees.add(target[0])
+
+    def _track_agent_key(self, key, category_id):
+        self._latest_agent_key = key
+        if self._agent_history_keys is not None and category_id % self.agent_pose_stride == 0:
+            self._agent_history_keys.append(key)
+
+    def _get_tracked_agent_nodes(self):
+        """Newest agent pose node plus the decimated history, without walking the whole trajectory.
+
+        Agent poses are appended with consecutive symbol indices, so new poses are found by probing
+        forward from the last seen one. The dynamic layers are only scanned on the first call.
+        """
+        graph = self.pipeline.graph
+        if self._latest_agent_key is None or not graph.has_node(self._latest_agent_key):
+            self._latest_agent_key = None
+            if self._agent_history_keys is not None:
+                self._agent_history_keys.clear()
+            agent_nodes = [node for layer in graph.dynamic_layers for node in layer.nodes if 'a' in node.id.category.lower()]
+            for node in sorted(agent_nodes, key=lambda node: node.id.category_id):
+                self._track_agent_key(node.id.value, int(node.id.category_id))
+        else:
+            while graph.has_node(self._latest_agent_key + 1):
+                node = graph.get_node(self._latest_agent_key + 1)
+                self._track_agent_key(node.id.value, int(node.id.category_id))
+
+        if self._latest_agent_key is None:
+            return []
+        keys = list(self._agent_history_keys) if self._agent_history_keys is not None else []
+        if self._latest_agent_key not in keys:
+            keys.append(self._latest_agent_key)
+        return [graph.get_node(key) for key in keys]
+
+    def _build_sg_from_hydra_graph(self):
+        # Every type is re-logged as a whole batch at the next flush, and the boxes are re-logged below, so nothing needs clearing
+        if not self.incremental_update:
+            self._reset_hydra_cache()
+        # Undo the frontiers, room labels and region removal applied to the mirror after the previous update
+        self._hydra_graph.rollback()
+        # Frontier edges are rebuilt from scratch in update_frontier_nodes
+        self._rr_frontier_edges = [], []
+
+        agent_nodes = self._get_tracked_agent_nodes()
+        agent_edges = [] # place->agent
+        for node in agent_nodes:
+            parent = node.get_parent()
+            if parent is not None:
+                agent_edges.append((parent, node.id.value))
+        dirty_nodes = self._sync_hydra_nodes(export_graph_nodes(self.pipeline.graph, extra_nodes=agent_nodes))
+        self._sync_hydra_edges(chain(((edge.source, edge.target) for edge in self.pipeline.graph.edges), agent_edges), dirty_nodes)
+
+        # Post-processing (frontiers, room labels, region removal) is applied on top of the mirror and rolled back next update
+        self.filtered_graph = self._hydra_graph
+        self.filtered_graph.checkpoint()
+
+        # Rooms and regions each share a layer, so the mirror lists them in Hydra key order
+        self._room_ids = self.filtered_graph.node_ids('room')
+        self._region_node_ids = self.filtered_graph.node_ids('region')
+        self._frontier_node_ids = []
+        objects = self._hydra_objects
+        kept = ~objects['filtered']
+        self._object_node_ids = objects['nodeid'][kept].tolist()
+        self._object_node_names = objects['name'][kept].tolist()
+
+        if len(self._hydra_agents) > 0:
+            self.curr_agent_id = self._hydra_agents['nodeid'][np.argmax(self._hydra_agents['category_id'])]
+            self.curr_agent_pos = self.get_position_from_id(self.curr_agent_id)
+
         self._room_names = self._room_ids.copy()
+        self.filtered_obj_ids = objects['nodeid'][kept]
+        self.filtered_obj_positions = objects['position'][kept]
+        # Copies, as the columns are updated in place while the logger thread may still be reading them
         self.bb_info = {
-            'object_node_positions': object_node_positions,
-            'bb_half_sizes': bb_half_sizes,
-            'bb_centroids': bb_centroids,
-            'bb_mat3x3': bb_mat3x3,
-            'bb_labels': bb_labels,
-            'bb_colors': bb_colors,
+            'object_node_positions': objects['position'].copy(),
+            'bb_half_sizes': objects['half_size'].copy(),
+            'bb_centroids': objects['centroid'].copy(),
+            'bb_mat3x3': objects['mat3x3'].copy(),
+            'bb_labels': objects['name'].tolist(),
+            'bb_colors': objects['color'].copy(),
         }
         if self.rr_logger is not None:
             self.rr_logger.log_bb_data(self.bb_info)
-        ## Adding edges
-        for edge in chain(self.pipeline.graph.edges, self.pipeline.graph.dynamic_interlayer_edges):
-            source_node = self.pipeline.graph.get_node(edge.source)
-            sourceid, source_type, source_name = self._get_node_properties(source_node)
-            
-            target_node = self.pipeline.graph.get_node(edge.target)
-            targetid, target_type, target_name = self._get_node_properties(target_node)
-            edge_type = f'{source_type}-to-{target_type}'
-            edgeid = f'{sourceid}-to-{targetid}'
-
-            # Filtering scene graph
-            if source_name in self.filter_out_objects or target_name in self.filter_out_objects:
-                continue
-            
-            # if 'object' in source_type and 'object' in target_type: # Object->Object
-            #     continue
-            if 'region' in source_type and 'region' in target_type: # Place->Place
-                continue
-            if 'frontier' in source_type or 'frontier' in target_type: # ALL FRONTIERS for now, we add frontiers later
-                continue
-            if 'agent' in source_type and 'agent' in target_type: # agent->agent
-                continue
-            
-            if self.rr_logger is not None:
-                self.rr_logger.log_hydra_graph(is_node=False, edge_type=edge_type, edgeid=edgeid, node_pos_source=np.array(source_node.attributes.position), node_pos_target=np.array(target_node.attributes.position))
-            
-            self.filtered_netx_graph.add_edges_from([(
-                sourceid, targetid,
-                {'source_name': source_name,
-                'target_name': target_name,
-                'type': edge_type}
-            )])
-        
+        self._update_spatial_index()
+
+    def _update_spatial_index(self):
+        # The KD-tree is only rebuilt when the filtered objects moved or changed
+        if not np.array_equal(self.spatial_index.object_ids, self.filtered_obj_ids) or not np.array_equal(self.spatial_index.positions, self.filtered_obj_positions):
+            self.spatial_index.set_objects(
+                self.filtered_obj_ids,
+                self.filtered_obj_positions,
+                centroids=self._hydra_objects['centroid'][~self._hydra_objects['filtered']],
+                half_sizes=self._hydra_objects['half_size'][~self._hydra_objects['filtered']],
+                rotations=self._hydra_objects['mat3x3'][~self._hydra_objects['filtered']],
+            )
+        self._index_rooms()
+
+    def _index_rooms(self, full=False):
+        agent_ids = [self.curr_agent_id] if hasattr(self, 'curr_agent_id') else []
+        if full or self._room_index_stale or not self.incremental_update:
+            self.spatial_index.set_rooms(self.filtered_graph, agent_ids)
+        else:
+            # Only changed objects and the subtrees below added or removed hierarchy edges can change rooms
+            nodeids = self._room_index_nodes | self._room_index_subtrees | hierarchical_descendants(self.filtered_graph, self._room_index_subtrees)
+            self.spatial_index.update_rooms(self.filtered_graph, nodeids, agent_ids)
+        self._room_index_nodes, self._room_index_subtrees = set(), set()
+        self._room_index_stale = False
+
     def update_frontier_nodes(self, frontier_nodes):
         if len(frontier_nodes)>0:
-            self.filtered_obj_positions = np.array(self.filtered_obj_positions)
-            self.filtered_obj_ids = np.array(self.filtered_obj_ids)
-            self._frontier_node_ids = []
-            for i in range(frontier_nodes.shape[0]):
-                attr={}
-                attr['position'] = list(frontier_nodes[i])
-                attr['name'] = 'frontier'
-                attr['layer'] = 2
-                nodeid = f'frontier_{i}'
-                self._frontier_node_ids.append(nodeid)
-                self.filtered_netx_graph.add_nodes_from([(nodeid, attr)])
-
-                dist = np.linalg.norm((np.array(frontier_nodes[i]) - self.filtered_obj_positions), axis=1)
-                relevant_objs = dist < self.thresh
-                relevent_node_ids = self.filtered_obj_ids[relevant_objs]
-                relevant_obj_pos = self.filtered_obj_positions[relevant_objs]
-
-                if self.enrich_frontiers:
-                    edge_type = 'frontier-to-object'
-                    
-                    for obj_id, obj_pos in zip(relevent_node_ids,relevant_obj_pos):
-                        edgeid = f'{nodeid}-to-{obj_id}'
-
-                        self.filtered_netx_graph.add_edges_from([(
+            frontier_nodes = np.asarray(frontier_nodes)
+            self._frontier_node_ids = [f'frontier_{i}' for i in range(frontier_nodes.shape[0])]
+            self.filtered_graph.add_nodes_from([
+                (nodeid, {'position': list(frontier_pos), 'name': 'frontier', 'layer': 2})
+                for nodeid, frontier_pos in zip(self._frontier_node_ids, frontier_nodes)
+            ])
+
+            if self.enrich_frontiers and len(self.filtered_obj_ids) > 0:
+                # Find all frontier neighbourhoods in a single batch query on the object index
+                relevant_objs = self.spatial_index.within_radius_batch(frontier_nodes, self.thresh)
+
+                edge_type = 'frontier-to-object'
+                edges = []
+                for i, obj_idxs in enumerate(relevant_objs):
+                    nodeid = self._frontier_node_ids[i]
+                    for obj_idx in obj_idxs:
+                        obj_id = self.filtered_obj_ids[obj_idx]
+                        edges.append((
                             nodeid, obj_id,
                             {'source_name': 'frontier',
                             'target_name': 'object',
                             'type': edge_type}
-                        )])
-                        if self.rr_logger is not None:
-                            self.rr_logger.log_hydra_graph(is_node=False, edge_type=edge_type, edgeid=edgeid, node_pos_source=frontier_nodes[i], node_pos_target=obj_pos)
+                        ))
+                        self._rr_frontier_edges[0].append(frontier_nodes[i])
+                        self._rr_frontier_edges[1].append(self.filtered_obj_positions[obj_idx])
+                self.filtered_graph.add_edges_from(edges)
+
+    def _get_room_object_names(self, room_id):
+        object_ids = self.spatial_index.room_objects(room_id)
+        return np.unique([self.filtered_graph.name(object_id) for object_id in object_ids])
+
+    def _room_label_messages(self, object_names):
+        return [
+            {"role": "user", "content": f"Given the list of objects: {object_names}. Which room are these objects most likely found in? Keep explanation very brief."}
+        ]
+
+    def _classify_room(self, object_names, room_id=''):
+        cache_key = RoomLabelCache.make_key(object_names, model=self.room_label_model)
+        room_label = self.room_label_cache.get(cache_key)
+        if room_label is not None:
+            return room_label
+
+        start = time.time()
+        completion = client.beta.chat.completions.parse(
+            model=self.room_label_model,
+            messages=self._room_label_messages(object_names),
+            response_format=Room_response,
+        )
+        print(f" ======== time for room {room_id} enrichment: {time.time()-start}")
+        room_label = completion.choices[0].message.parsed.room.value
+        self.room_label_cache.put(cache_key, room_label, object_names)
+        return room_label
+
+    def _classify_room_local(self, object_names):
+        room_label, evidence = self.room_classifier.classify(object_names)
+        return Room_response(explanation=f"Objects typical of a {room_label}: {', '.join(evidence)}", room=Rooms(room_label))
+
+    async def _classify_rooms_async(self, rooms):
+        """Classify all cache-missing rooms concurrently, writing each label into the graph as it completes."""
+        semaphore = asyncio.Semaphore(self.room_enrichment_concurrency)
+
+        async def classify(async_client, room_id, object_names, cache_key):
+            async with semaphore:
+                start = time.time()
+                try:
+                    completion = await asyncio.wait_for(
+                        async_client.beta.chat.completions.parse(
+                            model=self.room_label_model,
+                            messages=self._room_label_messages(object_names),
+                            response_format=Room_response,
+                        ),
+                        timeout=self.room_enrichment_timeout,
+                    )
+                    room_label = completion.choices[0].message.parsed.room.value
+                    self.room_label_cache.put(cache_key, room_label, object_names)
+                except Exception as e:
+                    print(f" ======== room {room_id} enrichment failed ({e!r}), using fallback label")
+                    room_label = self.room_enrichment_fallback
+                print(f" ======== time for room {room_id} enrichment: {time.time()-start}")
+            self.filtered_graph.set_node_attr(room_id, 'name', room_label)
+
+        pending = []
+        for room_id, object_names in rooms:
+            cache_key = RoomLabelCache.make_key(object_names, model=self.room_label_model)
+            room_label = self.room_label_cache.get(cache_key)
+            if room_label is not None:
+                self.filtered_graph.set_node_attr(room_id, 'name', room_label)
+            else:
+                pending.append((room_id, object_names, cache_key))
+
+        if len(pending) > 0:
+            start = time.time()
+            async with AsyncOpenAI() as async_client:
+                await asyncio.gather(*(classify(async_client, *room) for room in pending))
+            print(f" ======== time for concurrent enrichment of {len(pending)} rooms: {time.time()-start}")
 
     def add_room_labels_to_sg(self):
-        self._room_names = []
         if len(self._room_ids)>0:
-            for room_id in self._room_ids:
-                place_ids = [place_id for place_id in self.filtered_netx_graph.successors(room_id) if 'room' not in place_id] # ignore room->room
-                object_ids = [object_id for place_id in place_ids for object_id in self.filtered_netx_graph.successors(place_id) if 'agent' not in object_id] # ignore place->agent
-                object_names = np.unique([self.filtered_netx_graph.nodes[object_id]['name'] for object_id in object_ids])
-                
-                start = time.time()
-                completion = client.beta.chat.completions.parse(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "user", "content": f"Given the list of objects: {object_names}. Which room are these objects most likely found in? Keep explanation very brief."}
-                    ],
-                    response_format=Room_response,
-                )
-                print(f" ======== time for room {room_id} enrichment: {time.time()-start}")
-                self.filtered_netx_graph.nodes[room_id]['name'] = completion.choices[0].message.parsed.room.value
-                self._room_names.append(completion.choices[0].message.parsed.room.value)
+            rooms = [(room_id, self._get_room_object_names(room_id)) for room_id in self._room_ids]
         else:
             # If no room nodes exist, add room_0 to graph and egdes to regions 
             self._room_ids = ['room_0']
-            object_names = np.unique([self.filtered_netx_graph.nodes[object_id]['name'] for object_id in self._object_node_ids])
-            start = time.time()
-            completion = client.beta.chat.completions.parse(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "user", "content": f"Given the list of objects: {object_names}. Which room are these objects most likely found in? Keep explanation very brief."}
-                ],
-                response_format=Room_response,
-            )
-            print(f" ======== time for room enrichment: {time.time()-start}")
 
-            # Add node to graph
+            # Add node to graph, the name is filled in by the enrichment below
             attr={
-                'name': completion.choices[0].message.parsed.room.value,
+                'name': 'room',
                 'layer': 4
             }
-            self.filtered_netx_graph.add_nodes_from([('room_0', attr)])
-            self._room_names.append(completion.choices[0].message.parsed.room.value)
+            self.filtered_graph.add_nodes_from([('room_0', attr)])
 
             # Add edges from room to region
             edge_type = 'room-to-region'
             for reg_id in self._region_node_ids:
-                self.filtered_netx_graph.add_edges_from([(
+                self.filtered_graph.add_edges_from([(
                     'room_0', reg_id,
                     {'source_name': 'room',
                     'target_name': 'region',
                     'type': edge_type}
                 )])
+            # room_0 only lives until the next rollback, so the next build re-indexes every object
+            self._index_rooms(full=True)
+            self._room_index_stale = True
+            rooms = [('room_0', np.unique([self.filtered_graph.name(object_id) for object_id in self._object_node_ids]))]
+
+        if self.room_label_backend == 'local':
+            for room_id, object_names in rooms:
+                self.filtered_graph.set_node_attr(room_id, 'name', self._classify_room_local(object_names).room.value)
+        elif self.async_room_enrichment and not _event_loop_running():
+            asyncio.run(self._classify_rooms_async(rooms))
+        else:
+            for room_id, object_names in rooms:
+                self.filtered_graph.set_node_attr(room_id, 'name', self._classify_room(object_names, room_id))
+        self._room_names = [self.filtered_graph.name(room_id) for room_id in self._room_ids]
 
 
     def _get_node_properties(self, node):
-        # print(f"layer: {node.layer}. Category: {node.id.category.lower()}{node.id.category_id}. Active Frontier: {node.attributes.active_frontier}")
-        if 'p' in node.id.category.lower():
-            nodeid = f'region_{node.id.category_id}'
-            node_type = 'region'
-            node_name = 'region'
-        if 'f' in node.id.category.lower(): 
-            nodeid = f'frontier_{node.id.category_id}'
-            node_type = 'frontier'
-            node_name = 'frontier'
-        if 'o' in node.id.category.lower():
-            nodeid = f'object_{node.id.category_id}'
-            node_type = 'object'
-            node_name = node.attributes.name
-        if 'r' in node.id.category.lower():
-            nodeid = f'room_{node.id.category_id}'
-            node_type = 'room'
-            node_name = 'room'
-        if 'b' in node.id.category.lower():
-            nodeid = f'building_{node.id.category_id}'
-            node_type = 'building'
-            node_name = 'building'
-        if 'a' in node.id.category.lower():
-            nodeid = f'agent_{node.id.category_id}'
-            node_type = 'agent'
-            node_name = 'agent'
+        node_type = CATEGORY_TYPES[node.id.category.lower()]
+        nodeid = f'{node_type}_{node.id.category_id}'
+        node_name = node.attributes.name if node_type == 'object' else node_type
         return nodeid, node_type, node_name
     
     def get_current_semantic_state_str(self):
-        agent_pos = self.filtered_netx_graph.nodes[self.curr_agent_id]['position']
+        agent_pos = self.filtered_graph.nodes[self.curr_agent_id]['position']
         agent_loc_str = f'The agent is currently at node {self.curr_agent_id} at position {agent_pos}'
-        if self.include_regions:
-            agent_place_ids = [place_id for place_id in self.filtered_netx_graph.predecessors(self.curr_agent_id)]
-            room_id = [room_id for room_id in self.filtered_netx_graph.predecessors(agent_place_ids[0])]
-        else:
-            room_id = [room_id for room_id in self.filtered_netx_graph.predecessors(self.curr_agent_id)]
+        room_id = self.spatial_index.room_of(self.curr_agent_id)
         
         room_str = ''
-        if len(room_id) > 0:
-            room_name = self.filtered_netx_graph.nodes[room_id[0]]['name']
+        if room_id is not None and self.filtered_graph.has_node(room_id):
+            room_name = self.filtered_graph.name(room_id)
             if (room_name != 'room'):
-                room_str = f' at room node: {room_id[0]} with name {room_name}'
+                room_str = f' at room node: {room_id} with name {room_name}'
         return f'{agent_loc_str} {room_str}'
     
     def update(self, imgs_rgb=[], imgs_depth=None, intrinsics=None, extrinsics=None, frontier_nodes=[]):
+        self._scene_graph_str = None
 
         if not self.no_scene_graph:
             self._build_sg_from_hydra_graph()
             self.update_frontier_nodes(frontier_nodes)
+            self._flush_hydra_graph_log()
 
-        self.save_best_image(imgs_rgb)
+        self.save_best_image(imgs_rgb, imgs_depth, intrinsics, extrinsics)
 
         if self.enrich_rooms and not self.no_scene_graph:
             self.add_room_labels_to_sg()
@@ -395,120 +687,204 @@ class SceneGraphSim:
         if not self.include_regions:
             self.remove_region_nodes()
 
-    def get_position_from_id(self, nodeid):
-        return np.array(self.filtered_netx_graph.nodes[nodeid]['position'])
+    def close(self):
+        """Release per-episode resources: the key-frame scoring worker (which holds this object and its image model) and the room label store."""
+        if self.key_frame_selector is not None:
+            self.key_frame_selector.close()
+            self.key_frame_selector = None
+        if self.room_label_cache is not None:
+            self.room_label_cache.close()
+            self.room_label_cache = None
+
+    def _embed_texts(self, texts):
+        """Normalized features from the CLIP/SigLIP text tower loaded for key-frame selection, cached per string."""
+        new_texts = [text for text in dict.fromkeys(texts) if text not in self._text_embeds]
+        if len(new_texts) > 0:
+            padding = True if self.sg_cfg.key_frame_selection.use_clip_for_images else "max_length"
+            text_inputs = self.processor(text=new_texts, padding=padding, truncation=True, return_tensors="pt").to(self.device)
+            with torch.no_grad():
+                features = self.model.get_text_features(**text_inputs)
+            features = torch.nn.functional.normalize(features, dim=-1).cpu().numpy()
+            for text, feature in zip(new_texts, features):
+                self._text_embeds[text] = feature
+        return np.stack([self._text_embeds[text] for text in texts])
+
+    def _question_similarity(self, names):
+        if len(names) == 0:
+            return np.zeros(0)
+        if self.model is None:
+            return lexical_similarity(names, self.clean_ques_ans)
+        embeds = self._embed_texts(list(names) + [self.clean_ques_ans])
+        return embeds[:-1] @ embeds[-1]
+
+    def get_relevant_subgraph(self, token_budget=None):
+        """Subgraph of the objects, rooms and frontiers most relevant to the question that fits in token_budget.
+
+        Nodes are ranked by text similarity to the question and hop distance to the agent. The top ones are
+        kept together with their ancestors, and the current agent and its room are always kept.
+        """
+        token_budget = token_budget if token_budget is not None else self.prompt_token_budget
+        graph = self.filtered_graph
+        if token_budget is None:
+            return graph
+
+        objects_rooms = graph.node_ids(('object', 'room'))
+        sims = dict(zip(objects_rooms, self._question_similarity([graph.name(nodeid) for nodeid in objects_rooms])))
+        default_sim = min(sims.values()) if len(sims) > 0 else 0.
+        # Frontiers are as relevant as the most relevant object next to them
+        for nodeid in graph.node_ids('frontier'):
+            sims[nodeid] = max([sims[obj_id] for obj_id in graph.successors(nodeid) if obj_id in sims], default=default_sim)
+
+        keep_ids = []
+        candidates = list(sims.keys())
+        hops = np.full(len(candidates), np.inf)
+        if hasattr(self, 'curr_agent_id') and graph.has_node(self.curr_agent_id):
+            keep_ids.append(self.curr_agent_id)
+            hops = graph.hop_distances(self.curr_agent_id)[[graph.row(nodeid) for nodeid in candidates]]
+
+        order = rank_by_relevance([sims[nodeid] for nodeid in candidates], hops, self.relevance_distance_weight)
+        ranked_ids = [candidates[i] for i in order]
+        return budgeted_subgraph(graph, ranked_ids, keep_ids, token_budget, fmt=self.scene_graph_format, precision=self.scene_graph_precision)
 
-    def save_best_image(self, imgs_rgb):
+    def get_position_from_id(self, nodeid):
+        return self.filtered_graph.positions([nodeid])[0]
+
+    def _frame_logits(self, imgs):
+        """Image-text logits of frames against the question labels, reusing the text features cached at init."""
+        padding = True if self.sg_cfg.key_frame_selection.use_clip_for_images else "max_length" # HuggingFace says SigLIP was trained on "max_length"
+        imgs_embed = self.processor(images=imgs, return_tensors="pt", padding=padding).to(self.device)
+        with torch.no_grad():
+            image_features = encode_images(self.image_encoder, imgs_embed['pixel_values']).to(self._question_text_features.device)
+            logits = (image_features @ self._question_text_features.T).squeeze(-1) * self.model.logit_scale.exp()
+            if getattr(self.model, 'logit_bias', None) is not None: # SigLIP
+                logits = logits + self.model.logit_bias
+        return logits.detach().cpu().numpy().reshape(-1)
+
+    def add_trajectory_frame(self, img_rgb, depth=None, pose=None):
+        """Hand a rendered frame (with its depth and 4x4 camera pose, if known) to the streaming key-frame selector, if enabled."""
+        if self.key_frame_selector is not None and self.save_image:
+            self.key_frame_selector.add_frame(img_rgb, depth, pose)
+
+    def _geometric_key_frames(self, imgs_rgb, imgs_depth, intrinsics, extrinsics):
+        """Top-K frames by question-relevant scene graph objects in view, from bb_info and the camera poses."""
+        bb_info = getattr(self, 'bb_info', None)
+        if bb_info is None or len(bb_info['bb_labels']) == 0 or imgs_depth is None or intrinsics is None or extrinsics is None:
+            return []
+        kf_cfg = self.sg_cfg.key_frame_selection
+        query = ' '.join([self.clean_ques_ans, self.enrich_object_labels or ''])
+        weights = lexical_similarity(bb_info['bb_labels'], query)
+        scores, _ = geometric_frame_scores(
+            bb_info['bb_centroids'], bb_info['bb_half_sizes'], weights, imgs_depth, intrinsics, extrinsics,
+            depth_tolerance=kf_cfg.get('depth_tolerance', 0.3), max_depth=kf_cfg.get('max_depth', None))
+        useful = np.array([score > 0 and not is_mostly_black(img) for score, img in zip(scores, imgs_rgb)], dtype=bool)
+        top_k_indices = [idx for idx in np.argsort(-scores, kind='stable') if useful[idx]][:kf_cfg.topk]
+        return [imgs_rgb[idx] for idx in top_k_indices]
+
+    def save_best_image(self, imgs_rgb, imgs_depth=None, intrinsics=None, extrinsics=None):
 
         img_idx = 0
         while (self.output_path / f'current_img_{img_idx}.png').exists():
             img_idx += 1
 
-        if len(imgs_rgb)>0 and self.save_image and (self.sg_cfg.key_frame_selection.use_clip_for_images or self.sg_cfg.key_frame_selection.use_siglip_for_images):
+        kf_cfg = self.sg_cfg.key_frame_selection
+        use_geometry = kf_cfg.get('use_geometry_for_images', False) and not (kf_cfg.use_clip_for_images or kf_cfg.use_siglip_for_images)
+        if len(imgs_rgb)>0 and self.save_image and (kf_cfg.use_clip_for_images or kf_cfg.use_siglip_for_images or use_geometry):
             start = time.time()
-            imgs_rgb = np.array(imgs_rgb)
-            w, h = imgs_rgb[0].shape[0], imgs_rgb[0].shape[1]
-            # Remove black images
-            black_pixels_mask = np.all(imgs_rgb == 0, axis=-1)
-            num_black_pixels = np.sum(black_pixels_mask, axis=(1, 2))
-            useful_img_idxs = num_black_pixels < 0.3*w*h
-            useful_imgs = imgs_rgb[useful_img_idxs]
-            sampled_images = useful_imgs[::self.sg_cfg.img_subsample_freq]
-
-            padding = True if self.sg_cfg.key_frame_selection.use_clip_for_images else "max_length" # HuggingFace says SigLIP was trained on "max_length"
-            imgs_embed = self.processor(images=sampled_images, return_tensors="pt", padding=padding).to(self.device)
-            with torch.no_grad():
-                outputs = self.model(**self.question_embed_labels, **imgs_embed)
-            logits_per_text = outputs.logits_per_image # this is the image-text similarity score
-            probs = logits_per_text.softmax(dim=0).squeeze() # we can take the softmax to get the label probabilities
-    
-            probs, logits_per_text = probs.detach().cpu().numpy(), logits_per_text.squeeze().detach().cpu().numpy()
-            best = np.argmax(probs)
-            top_k_indices = np.argsort(probs)[::-1][:self.sg_cfg.key_frame_selection.topk]
-
-            if self.sg_cfg.key_frame_selection.visualize_best_image:
-                labeled_frames = []
-                for idx in range(len(sampled_images)):
-                    color_img = sampled_images[idx].copy()
-                    label = f'{probs[idx]:.2f}'
-                    if idx in top_k_indices:
-                        label = label + f'_best{np.where(top_k_indices==idx)[0][0]}'
-                    cv2.putText(color_img, str(label), (20, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
-                    labeled_frames.append(color_img)
-
-                imageio.mimsave(self.output_path / f'images_with_clip_probs_{img_idx}.gif', labeled_frames, fps=0.5)
+            if use_geometry:
+                # Scene graph objects matching the question, projected into each view
+                best_imgs = self._geometric_key_frames(imgs_rgb, imgs_depth, intrinsics, extrinsics)
+            elif self.key_frame_selector is not None and self.key_frame_selector.num_frames > 0:
+                # Frames were already scored while the trajectory was executing
+                best_imgs = [img for _, img in self.key_frame_selector.finish()]
+                self.key_frame_selector.reset()
+            else:
+                imgs_rgb = np.array(imgs_rgb)
+                if self.frame_prefilter is not None:
+                    self.frame_prefilter.reset()
+                    # Depth and pose enable the flat-depth and pose-delta checks when the caller has them
+                    depths = imgs_depth if imgs_depth is not None else [None] * len(imgs_rgb)
+                    poses = extrinsics if extrinsics is not None else [None] * len(imgs_rgb)
+                    sampled_images = imgs_rgb[[self.frame_prefilter.accept(img, depth, pose)[0] for img, depth, pose in zip(imgs_rgb, depths, poses)]]
+                    if len(sampled_images) == 0:
+                        sampled_images = imgs_rgb[-1:]
+                else:
+                    w, h = imgs_rgb[0].shape[0], imgs_rgb[0].shape[1]
+                    # Remove black images
+                    black_pixels_mask = np.all(imgs_rgb == 0, axis=-1)
+                    num_black_pixels = np.sum(black_pixels_mask, axis=(1, 2))
+                    useful_img_idxs = num_black_pixels < 0.3*w*h
+                    useful_imgs = imgs_rgb[useful_img_idxs]
+                    sampled_images = useful_imgs[::self.sg_cfg.img_subsample_freq]
+
+                logits_per_image = self._frame_logits(sampled_images) # this is the image-text similarity score
+                probs = np.exp(logits_per_image - logits_per_image.max())
+                probs = probs / probs.sum() # softmax over images
+                top_k_indices = np.argsort(probs)[::-1][:self.sg_cfg.key_frame_selection.topk]
+
+                if self.sg_cfg.key_frame_selection.visualize_best_image:
+                    labeled_frames = []
+                    for idx in range(len(sampled_images)):
+                        color_img = sampled_images[idx].copy()
+                        label = f'{probs[idx]:.2f}'
+                        if idx in top_k_indices:
+                            label = label + f'_best{np.where(top_k_indices==idx)[0][0]}'
+                        cv2.putText(color_img, str(label), (20, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
+                        labeled_frames.append(color_img)
+
+                    imageio.mimsave(self.output_path / f'images_with_clip_probs_{img_idx}.gif', labeled_frames, fps=0.5)
+                best_imgs = [sampled_images[idx] for idx in top_k_indices]
 
             if self.save_image:
                 rel_imgs = []
-                for idx in range(len(top_k_indices)):
-                    color_img = sampled_images[top_k_indices[idx]].copy()
+                for idx in range(len(best_imgs)):
+                    color_img = best_imgs[idx].copy()
                     cv2.putText(color_img, str(f"Image {idx+1}"), (20, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
                     rel_imgs.append(color_img)
                 # adding the last image
                 if self.choose_final_image:
                     color_img = imgs_rgb[-1].copy()
-                    cv2.putText(color_img, str(f"Image {len(top_k_indices)+1}"), (20, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
+                    cv2.putText(color_img, str(f"Image {len(best_imgs)+1}"), (20, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
                     rel_imgs.append(color_img)
                 
+                if len(rel_imgs) == 0:
+                    rel_imgs.append(imgs_rgb[-1].copy())
                 final_img = Image.fromarray(np.concatenate(rel_imgs, axis=1))
 
                 final_img.save(self.output_path / f"current_img_{img_idx}.png")
-            print(f"===========time taken for CLIP/SigLIP emb: {time.time()-start}")
+            print(f"===========time taken for key frame selection: {time.time()-start}")
         
-        # Do not use CLIP or SigClip but save the final image (indexed)
-        if len(imgs_rgb)>0 and self.save_image and (not self.sg_cfg.key_frame_selection.use_clip_for_images) and (not self.sg_cfg.key_frame_selection.use_siglip_for_images):
+        # Do not use CLIP, SigClip or geometry but save the final image (indexed)
+        if len(imgs_rgb)>0 and self.save_image and (not kf_cfg.use_clip_for_images) and (not kf_cfg.use_siglip_for_images) and (not use_geometry):
             final_img = Image.fromarray(imgs_rgb[-1])
             final_img.save(self.output_path / f"current_img_{img_idx}.png")
 
-    def remove_close_positions(self, data, threshold):
-        # Sort the list by confidence in descending order
-        data_sorted = sorted(data, key=lambda x: x['confidence'], reverse=True)
-
-        result = []
-        for i, current in enumerate(data_sorted):
-            # Check if current position is too close to any already included points
-            too_close = False
-            for chosen in result:
-                # Compute the distance between positions
-                distance = np.linalg.norm(np.array(current['pos']) - np.array(chosen['pos']))
-                if distance < threshold:
-                    too_close = True
-                    break
-            
-            # Only keep if not too close to any already selected points
-            if not too_close:
-                result.append(current)
-
-        return result
-
-    
     def remove_region_nodes(self):
-        # Identify and process each 'room' node
+        # Adjacency is read for every room before the graph is rewired, so the CSR view is only built once
+        room_edges, removed_place_ids = [], set()
         for room_id in self.room_node_ids:
             # Find all 'region' nodes connected to this 'room'
-            place_ids = [place_id for place_id in self.filtered_netx_graph.successors(room_id) if 'room' not in place_id]
-            object_ids = [object_id for place_id in place_ids for object_id in self.filtered_netx_graph.successors(place_id) if 'agent' not in object_id] # ignore place->agent
-            agent_ids = [agent_id for place_id in place_ids for agent_id in self.filtered_netx_graph.successors(place_id) if 'agent' in agent_id] # only place->agent
+            place_ids = [place_id for place_id in self.filtered_graph.successors(room_id) if 'room' not in place_id and place_id not in removed_place_ids]
+            # Children in the order of their place edges, which sets the order of the room->object edges
+            child_ids = [child_id for place_id in place_ids for child_id in self.filtered_graph.successors(place_id)]
+            object_ids = [object_id for object_id in child_ids if 'agent' not in object_id] # ignore place->agent
+            agent_ids = [agent_id for agent_id in child_ids if 'agent' in agent_id] # only place->agent
             
             # For each 'region' node, connect the 'room' directly to the 'object' children
             for object_id in object_ids:
-                # Add edges from room to region
-                edge_type = 'room-to-object'
-                self.filtered_netx_graph.add_edges_from([(
+                room_edges.append((
                     room_id, object_id,
                     {'source_name': 'room',
                     'target_name': 'object',
-                    'type': edge_type}
-                )])
-                    
+                    'type': 'room-to-object'}
+                ))
 
             for agent_id in agent_ids:
-                # Add edges from room to region
-                edge_type = 'room-to-agent'
-                self.filtered_netx_graph.add_edges_from([(
+                room_edges.append((
                     room_id, agent_id,
                     {'source_name': 'room',
                     'target_name': 'agent',
-                    'type': edge_type}
-                )])
-            self.filtered_netx_graph.remove_nodes_from(place_ids)
\ No newline at end of file
+                    'type': 'room-to-agent'}
+                ))
+            removed_place_ids.update(place_ids)
+        self.filtered_graph.add_edges_from(room_edges)
+        self.filtered_graph.remove_nodes_from(removed_place_ids)
\ No newline at end of file
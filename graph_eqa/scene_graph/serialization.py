@@ -0,0 +1,94 @@
+import json
+
+import numpy as np
+
+from graph_eqa.scene_graph.graph_store import NODE_TYPES, SceneGraphStore
+
+# Node types whose 'name' attribute only repeats the type, so it is implied by the node id
+_IMPLIED_NAMES = {'region', 'frontier', 'agent', 'building', 'room'}
+
+
+def _node_type(nodeid):
+    return str(nodeid).rsplit('_', 1)[0]
+
+
+def _group_key(nodeid):
+    return _node_type(nodeid) + 's'
+
+
+def _round_position(position, precision):
+    return [round(float(p), precision) for p in position]
+
+
+def node_link_str(graph):
+    """json.dumps(networkx.node_link_data(graph, edges='edges')), written straight from the store's columns."""
+    node_rows, edge_rows = graph.ordered_rows()
+    nodes = graph.node_attrs(node_rows)
+    for attr, nodeid in zip(nodes, graph.node_ids_at(node_rows)):
+        attr['id'] = nodeid
+    edges = graph.edge_attrs(edge_rows)
+    for attr, source, target in zip(edges, graph.node_ids_at(graph.edge_source[edge_rows]), graph.node_ids_at(graph.edge_target[edge_rows])):
+        attr['source'] = source
+        attr['target'] = target
+    return json.dumps({'directed': True, 'multigraph': False, 'graph': {}, 'nodes': nodes, 'edges': edges})
+
+
+def compact_str(graph, precision=2):
+    """Token-compact JSON view of the scene graph for planner prompts.
+
+    Hierarchical edges (higher layer -> lower layer) are implied by nesting
+    children under their parent, grouped by type ('rooms', 'regions', 'objects',
+    'agents'). Other edges (e.g. frontier -> object) become a 'near' list on the
+    source node. Positions are rounded and redundant names/layers are dropped.
+    Node ids are kept as-is since the planners' actions refer to them.
+    """
+    node_rows, edge_rows = graph.ordered_rows()
+    sources, targets = graph.edge_source[edge_rows], graph.edge_target[edge_rows]
+    # The first edge from a higher layer (other than a frontier) is a node's parent, in edge order
+    layers = np.maximum(graph.layer, 0)
+    hierarchical = np.flatnonzero((layers[sources] > layers[targets]) & (graph.node_type[sources] != NODE_TYPES.index('frontier')))
+    _, first = np.unique(targets[hierarchical], return_index=True)
+    is_parent = np.zeros(len(edge_rows), dtype=bool)
+    is_parent[hierarchical[first]] = True
+    parent = dict(zip(targets[is_parent].tolist(), sources[is_parent].tolist()))
+    near = {}
+    for source, target in zip(sources[~is_parent].tolist(), graph.node_ids_at(targets[~is_parent])):
+        near.setdefault(source, []).append(target)
+
+    entries = {}
+    for row, attr in zip(node_rows.tolist(), graph.node_attrs(node_rows)):
+        entry = {}
+        name = attr.get('name')
+        if name is not None and name not in _IMPLIED_NAMES:
+            entry['name'] = name
+        if 'position' in attr:
+            entry['pos'] = _round_position(attr['position'], precision)
+        if row in near:
+            entry['near'] = near[row]
+        entries[row] = entry
+
+    root = {}
+    for row, nodeid in zip(node_rows.tolist(), graph.node_ids_at(node_rows)):
+        container = entries[parent[row]] if row in parent else root
+        container.setdefault(_group_key(nodeid), {})[nodeid] = entries[row]
+    return json.dumps(root, separators=(',', ':'))
+
+
+SCENE_GRAPH_FORMATS = {
+    'node_link': lambda graph, precision: node_link_str(graph),
+    'compact': compact_str,
+}
+
+
+def serialize_scene_graph(graph, fmt='node_link', precision=2):
+    """Prompt text of a SceneGraphStore (a NetworkX graph is converted first)."""
+    if fmt not in SCENE_GRAPH_FORMATS:
+        raise NotImplementedError(f'Scene graph format {fmt} not implemented.')
+    if not isinstance(graph, SceneGraphStore):
+        graph = SceneGraphStore.from_networkx(graph)
+    return SCENE_GRAPH_FORMATS[fmt](graph, precision)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for JSON-like English text with BPE tokenizers
+    return (len(text) + 3) // 4
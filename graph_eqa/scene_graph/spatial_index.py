@@ -0,0 +1,113 @@
+from itertools import chain
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from graph_eqa.scene_graph.relevance import hierarchical_ancestors
+
+
+class SceneGraphSpatialIndex:
+    """KD-tree / AABB index over scene graph objects plus a room -> objects inverted index.
+
+    Object positions are indexed with a KD-tree for radius and nearest queries.
+    Box queries search the KD-tree with a radius inflated by the largest object
+    extent and then test axis-aligned bounding boxes exactly. The tree is only
+    rebuilt when the indexed objects change. Room membership can be rebuilt
+    (set_rooms) or refreshed for just the nodes whose hierarchy changed
+    (update_rooms).
+    """
+    def __init__(self):
+        self.object_ids = np.array([], dtype=object)
+        self.positions = np.zeros((0, 3))
+        self.aabb_min = np.zeros((0, 3))
+        self.aabb_max = np.zeros((0, 3))
+        self._tree = None
+        self._max_extent = 0.
+        self._object_set = set()
+        self._room_objects = {} # room id -> {object id: None}, an insertion-ordered set
+        self._object_room = {}
+        self._located_ids = []
+
+    def __len__(self):
+        return len(self.object_ids)
+
+    def set_objects(self, object_ids, positions, centroids=None, half_sizes=None, rotations=None):
+        self.object_ids = np.array(object_ids, dtype=object)
+        self._object_set = set(self.object_ids)
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        centroids = self.positions if centroids is None else np.asarray(centroids, dtype=float).reshape(-1, 3)
+        half_sizes = np.zeros_like(centroids) if half_sizes is None else np.asarray(half_sizes, dtype=float).reshape(-1, 3)
+        if rotations is not None and len(rotations) > 0:
+            # Axis-aligned extent of each oriented box: |R| @ half size
+            half_sizes = np.einsum('nij,nj->ni', np.abs(np.asarray(rotations, dtype=float).reshape(-1, 3, 3)), half_sizes)
+        self.aabb_min, self.aabb_max = centroids - half_sizes, centroids + half_sizes
+        # Largest distance from an object's position to any corner of its box
+        corner_offsets = np.maximum(np.abs(self.aabb_min - self.positions), np.abs(self.aabb_max - self.positions))
+        self._max_extent = float(np.linalg.norm(corner_offsets, axis=1).max()) if len(self.positions) > 0 else 0.
+        self._tree = cKDTree(self.positions) if len(self.positions) > 0 else None
+
+    def set_rooms(self, graph, located_ids=()):
+        """Room -> objects inverted index from the hierarchical (room -> region -> object) edges of graph.
+
+        located_ids (e.g. the agent) can be looked up with room_of but are not listed as room objects.
+        """
+        self._room_objects, self._object_room, self._located_ids = {}, {}, []
+        self.update_rooms(graph, self.object_ids, located_ids)
+
+    def update_rooms(self, graph, nodeids, located_ids=()):
+        """Re-locate only nodeids (objects added, removed or re-parented, in any order) and located_ids.
+
+        Entries of nodes that are no longer indexed objects are dropped. The located ids of the previous
+        call are dropped as well, so e.g. a new agent pose replaces the old one.
+        """
+        for nodeid in chain(self._located_ids, nodeids):
+            room_id = self._object_room.pop(nodeid, None)
+            if room_id is not None and nodeid in self._room_objects.get(room_id, {}):
+                del self._room_objects[room_id][nodeid]
+        self._located_ids = list(located_ids)
+        for nodeid in chain(nodeids, self._located_ids):
+            is_object = nodeid in self._object_set
+            if not (is_object or nodeid in self._located_ids) or not graph.has_node(nodeid):
+                continue
+            rooms = sorted(ancestor for ancestor in hierarchical_ancestors(graph, nodeid) if ancestor.startswith('room'))
+            if len(rooms) > 0:
+                self._object_room[nodeid] = rooms[0]
+                if is_object:
+                    self._room_objects.setdefault(rooms[0], {})[nodeid] = None
+
+    def within_radius(self, center, radius):
+        if self._tree is None:
+            return []
+        return [self.object_ids[i] for i in self._tree.query_ball_point(np.asarray(center, dtype=float), r=radius, return_sorted=True)]
+
+    def within_radius_batch(self, centers, radius):
+        """Object indices (into object_ids / positions) within radius of each center."""
+        if self._tree is None:
+            return [[] for _ in range(len(centers))]
+        return self._tree.query_ball_point(np.asarray(centers, dtype=float).reshape(-1, 3), r=radius, return_sorted=True)
+
+    def nearest(self, point, k=1):
+        if self._tree is None:
+            return []
+        k = min(k, len(self.object_ids))
+        _, idxs = self._tree.query(np.asarray(point, dtype=float), k=k)
+        return [self.object_ids[i] for i in np.atleast_1d(idxs)]
+
+    def in_box(self, box_min, box_max):
+        """Objects whose axis-aligned bounding box overlaps [box_min, box_max]."""
+        if self._tree is None:
+            return []
+        box_min, box_max = np.asarray(box_min, dtype=float), np.asarray(box_max, dtype=float)
+        center = 0.5 * (box_min + box_max)
+        radius = 0.5 * np.linalg.norm(box_max - box_min) + self._max_extent
+        idxs = np.array(self._tree.query_ball_point(center, r=radius, return_sorted=True), dtype=np.int64)
+        if len(idxs) == 0:
+            return []
+        overlap = np.all((self.aabb_min[idxs] <= box_max) & (self.aabb_max[idxs] >= box_min), axis=1)
+        return [self.object_ids[i] for i in idxs[overlap]]
+
+    def room_objects(self, room_id):
+        return list(self._room_objects.get(room_id, []))
+
+    def room_of(self, object_id):
+        return self._object_room.get(object_id)
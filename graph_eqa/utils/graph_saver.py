@@ -0,0 +1,95 @@
+import os, threading, time
+
+GRAPH_SAVE_POLICIES = ('trajectory_end', 'interval', 'on_demand', 'every_pose')
+
+
+class SceneGraphSaver:
+    """Writes dsg.json / filtered_dsg.json for a Hydra scene graph according to a policy.
+
+    'trajectory_end' saves after every executed trajectory, 'interval' additionally every
+    `interval` seconds, 'on_demand' only when save() is called and 'every_pose' on every pose.
+    The graph is cloned on the caller's thread (the pipeline keeps mutating it) and serialized
+    on a background thread. Only the newest pending snapshot is kept. Files are written to a
+    temporary path and renamed, so readers never see a partial file. With binary=True Hydra's
+    .sparkdsg format is used instead of json.
+    """
+    def __init__(self, output_path, policy='trajectory_end', interval=30.0, binary=False, background=True):
+        if policy not in GRAPH_SAVE_POLICIES:
+            raise NotImplementedError(f"Graph save policy {policy} is not implemented, use one of {GRAPH_SAVE_POLICIES}")
+        self.output_path = output_path
+        self.policy = policy
+        self.interval = interval
+        self.suffix = '.sparkdsg' if binary else '.json'
+        self._last_save = time.time()
+
+        self._pending = None
+        self._busy = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    @property
+    def paths(self):
+        return self.output_path / f"dsg{self.suffix}", self.output_path / f"filtered_dsg{self.suffix}"
+
+    def on_pose(self, graph):
+        if self.policy == 'every_pose' or (self.policy == 'interval' and time.time() - self._last_save >= self.interval):
+            self.save(graph)
+
+    def on_trajectory_end(self, graph):
+        if self.policy in ('trajectory_end', 'interval', 'every_pose'):
+            self.save(graph)
+
+    def save(self, graph):
+        self._last_save = time.time()
+        clone = getattr(graph, 'clone', None)
+        if self._thread is None or clone is None:
+            # Without a snapshot the graph can only be written while the pipeline is not stepping it
+            self._write(graph)
+            return
+        with self._cond:
+            self._pending = clone()
+            self._cond.notify_all()
+
+    def _write(self, graph):
+        dsg_path, filtered_path = self.paths
+        for path, save_fn in ((dsg_path, graph.save), (filtered_path, graph.save_filtered)):
+            # Hydra picks the format from the extension, so the temporary file keeps it
+            tmp_path = path.with_name(f".{path.stem}.tmp{self.suffix}")
+            save_fn(tmp_path, False)
+            os.replace(tmp_path, path)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                graph, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._write(graph)
+            except Exception as e:
+                print(f"saving the scene graph failed: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def flush(self):
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+
+    def close(self):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,221 @@
+import numpy as np
+
+# Hydra layer ids
+OBJECTS_LAYER, PLACES_LAYER, ROOMS_LAYER, BUILDINGS_LAYER = 2, 3, 4, 5
+AGENTS_LAYER = 2
+
+OBJECT_NAMES = [
+    "chair", "table", "sofa", "bed", "lamp", "tv", "cabinet", "shelf", "plant", "sink", "toilet", "refrigerator",
+    "microwave", "oven", "desk", "pillow", "mirror", "door", "picture", "rug", "towel", "bathtub", "book", "clock",
+]
+# Filtered out by SceneGraphSim, included so the filtering paths are exercised
+FILTERED_NAMES = ["floor", "ceiling"]
+
+
+class NodeSymbol:
+    def __init__(self, category, category_id):
+        self.category = category
+        self.category_id = category_id
+        self.value = (ord(category) << 56) + category_id
+
+    def __str__(self):
+        return f"{self.category}({self.category_id})"
+
+
+class BoundingBox:
+    def __init__(self, center, dimensions, rotation):
+        self.world_P_center = np.asarray(center, dtype=float)
+        self.dimensions = np.asarray(dimensions, dtype=float)
+        self.world_R_center = np.asarray(rotation, dtype=float)
+
+
+class NodeAttributes:
+    def __init__(self, position, name=None, semantic_label=0, bounding_box=None, color=None, last_update_time_ns=0):
+        self.position = np.asarray(position, dtype=float)
+        self.last_update_time_ns = last_update_time_ns
+        if name is not None:
+            self.name = name
+            self.semantic_label = semantic_label
+            self.color = np.zeros(3, dtype=np.uint8) if color is None else color
+        if bounding_box is not None:
+            self.bounding_box = bounding_box
+
+
+class SceneGraphNode:
+    def __init__(self, graph, symbol, attributes, layer, timestamp=0):
+        self._graph = graph
+        self.id = symbol
+        self.attributes = attributes
+        self.layer = layer
+        self.timestamp = timestamp
+
+    def get_parent(self):
+        return self._graph.parents.get(self.id.value)
+
+
+class SceneGraphEdge:
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+
+
+class SceneGraphLayer:
+    def __init__(self, layer_id, nodes):
+        self.id = layer_id
+        self.nodes = nodes
+
+
+class SyntheticSceneGraph:
+    """Stand-in for a Hydra `pipeline.graph` with the subset of the spark_dsg API used by SceneGraphSim.
+
+    Static layers hold buildings, rooms, places (and frontiers) and objects,
+    connected parent -> child. Agent poses live in a dynamic layer with
+    consecutive symbol ids and a place as parent.
+    """
+    def __init__(self):
+        self._static = {} # layer id -> {key: node}
+        self._agents = {}
+        self._edges = {}
+        self.parents = {}
+        self._time_ns = 0
+
+    def _tick(self):
+        self._time_ns += 1
+        return self._time_ns
+
+    @property
+    def layers(self):
+        return [SceneGraphLayer(layer_id, list(self._static[layer_id].values())) for layer_id in sorted(self._static)]
+
+    @property
+    def nodes(self):
+        return [node for layer_id in sorted(self._static) for node in self._static[layer_id].values()]
+
+    @property
+    def edges(self):
+        return list(self._edges.values())
+
+    @property
+    def dynamic_layers(self):
+        return [SceneGraphLayer(AGENTS_LAYER, list(self._agents.values()))]
+
+    def num_nodes(self):
+        return sum(len(nodes) for nodes in self._static.values()) + len(self._agents)
+
+    def has_node(self, key):
+        return key in self._agents or any(key in nodes for nodes in self._static.values())
+
+    def get_node(self, key):
+        if key in self._agents:
+            return self._agents[key]
+        for nodes in self._static.values():
+            if key in nodes:
+                return nodes[key]
+        raise IndexError(f"missing node {key}")
+
+    def add_node(self, category, category_id, layer, position, name=None, semantic_label=0, bounding_box=None):
+        symbol = NodeSymbol(category, category_id)
+        attributes = NodeAttributes(position, name, semantic_label, bounding_box, last_update_time_ns=self._tick())
+        node = SceneGraphNode(self, symbol, attributes, layer, timestamp=self._time_ns)
+        self._static.setdefault(layer, {})[symbol.value] = node
+        return symbol.value
+
+    def add_edge(self, source, target):
+        self._edges[(source, target)] = SceneGraphEdge(source, target)
+        self.parents[target] = source
+
+    def remove_node(self, key):
+        for nodes in self._static.values():
+            nodes.pop(key, None)
+        self._agents.pop(key, None)
+        self.parents.pop(key, None)
+        for edge_key in [edge_key for edge_key in self._edges if key in edge_key]:
+            del self._edges[edge_key]
+
+    def add_agent_pose(self, position, parent):
+        category_id = len(self._agents)
+        symbol = NodeSymbol('a', category_id)
+        self._agents[symbol.value] = SceneGraphNode(self, symbol, NodeAttributes(position, last_update_time_ns=self._tick()), AGENTS_LAYER, timestamp=int(1e8 * category_id))
+        self.parents[symbol.value] = parent
+        return symbol.value
+
+    def move_node(self, key, offset):
+        node = self.get_node(key)
+        node.attributes.position = node.attributes.position + offset
+        node.attributes.last_update_time_ns = self._tick()
+
+
+class SyntheticPipeline:
+    def __init__(self, graph):
+        self.graph = graph
+
+
+def make_synthetic_scene(num_objects, objects_per_place=5, places_per_room=8, rooms_per_floor=12, num_agent_poses=50, filtered_fraction=0.05, seed=0):
+    """Building -> room -> place -> object hierarchy with bounding boxes and an agent trajectory.
+
+    Rooms are 5 m cells on a grid, one building per `rooms_per_floor` rooms,
+    places are scattered inside rooms and objects around places.
+    """
+    rng = np.random.default_rng(seed)
+    graph = SyntheticSceneGraph()
+    num_places = max(1, int(np.ceil(num_objects / objects_per_place)))
+    num_rooms = max(1, int(np.ceil(num_places / places_per_room)))
+    num_buildings = max(1, int(np.ceil(num_rooms / rooms_per_floor)))
+    grid_width = int(np.ceil(np.sqrt(num_rooms)))
+
+    buildings = [graph.add_node('B', i, BUILDINGS_LAYER, [0., 0., 3. * i], name='building') for i in range(num_buildings)]
+    rooms, room_origins = [], []
+    for i in range(num_rooms):
+        origin = 5. * np.array([i % grid_width, i // grid_width, 0.])
+        room = graph.add_node('R', i, ROOMS_LAYER, origin + [2.5, 2.5, 1.5], name='room')
+        graph.add_edge(buildings[i // rooms_per_floor], room)
+        rooms.append(room)
+        room_origins.append(origin)
+
+    places, place_positions = [], []
+    for i in range(num_places):
+        room_idx = i % num_rooms
+        position = room_origins[room_idx] + [*(rng.random(2) * 5.), 1.]
+        place = graph.add_node('p', i, PLACES_LAYER, position)
+        graph.add_edge(rooms[room_idx], place)
+        places.append(place)
+        place_positions.append(position)
+    # Places in a room form a chain, like Hydra's traversability edges
+    for i in range(num_rooms, num_places):
+        graph.add_edge(places[i - num_rooms], places[i])
+
+    names = rng.choice(OBJECT_NAMES, size=num_objects)
+    filtered = rng.random(num_objects) < filtered_fraction
+    for i in range(num_objects):
+        place_idx = i % num_places
+        center = place_positions[place_idx] + rng.normal(scale=0.5, size=3)
+        angle = rng.random() * 2 * np.pi
+        rotation = np.array([[np.cos(angle), -np.sin(angle), 0.], [np.sin(angle), np.cos(angle), 0.], [0., 0., 1.]])
+        name = FILTERED_NAMES[i % 2] if filtered[i] else str(names[i])
+        obj = graph.add_node('O', i, OBJECTS_LAYER, center, name=name, semantic_label=i % 40,
+                             bounding_box=BoundingBox(center, 0.2 + rng.random(3), rotation))
+        graph.add_edge(places[place_idx], obj)
+
+    for i in range(num_agent_poses):
+        place_idx = int(rng.integers(num_places))
+        graph.add_agent_pose(place_positions[place_idx] + [0., 0., 0.5], places[place_idx])
+    return graph
+
+
+def random_frontiers(graph, num_frontiers, seed=0):
+    """Frontier positions scattered over the extent of the scene's places."""
+    rng = np.random.default_rng(seed)
+    positions = np.array([node.attributes.position for node in graph.nodes if node.id.category == 'p'])
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    return low + rng.random((num_frontiers, 3)) * (high - low)
+
+
+def step_synthetic_scene(graph, num_moved=10, seed=0):
+    """Simulate one perception step: a new agent pose and a few objects re-estimated."""
+    rng = np.random.default_rng(seed)
+    objects = [node.id.value for node in graph.nodes if node.id.category == 'O']
+    for key in rng.choice(objects, size=min(num_moved, len(objects)), replace=False):
+        graph.move_node(int(key), rng.normal(scale=0.05, size=3))
+    places = [node.id.value for node in graph.nodes if node.id.category == 'p']
+    parent = int(rng.choice(places))
+    return graph.add_agent_pose(graph.get_node(parent).attributes.position + [0., 0., 0.5], parent)
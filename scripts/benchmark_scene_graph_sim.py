@@ -0,0 +1,93 @@
+from omegaconf import OmegaConf
+import click
+import json, os, tempfile, time
+from pathlib import Path
+import numpy as np
+
+# SceneGraphSim creates an OpenAI client at import time, room enrichment is disabled below so no request is made
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+from graph_eqa.scene_graph.scene_graph_sim import SceneGraphSim
+from graph_eqa.utils.synthetic_scene import SyntheticPipeline, make_synthetic_scene, random_frontiers, step_synthetic_scene
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def run_update(sg_sim, frontiers):
+    """Time each stage of SceneGraphSim.update on the current pipeline graph."""
+    sg_sim._scene_graph_str = None
+    timings = {
+        'build': timed(sg_sim._build_sg_from_hydra_graph),
+        'frontiers': timed(lambda: sg_sim.update_frontier_nodes(frontiers)),
+        'remove_regions': timed(sg_sim.remove_region_nodes),
+    }
+    timings['scene_graph_str'] = timed(lambda: sg_sim.scene_graph_str)
+    return timings
+
+
+def benchmark(cfg, num_objects, num_frontiers, steps, seed):
+    graph = make_synthetic_scene(num_objects, seed=seed)
+    frontiers = random_frontiers(graph, num_frontiers, seed=seed)
+    with tempfile.TemporaryDirectory() as output_path:
+        sg_sim = SceneGraphSim(cfg, Path(output_path), SyntheticPipeline(graph))
+        first = run_update(sg_sim, frontiers)
+        # Later updates only see a new agent pose and a few re-estimated objects
+        incremental = []
+        for step in range(steps):
+            step_synthetic_scene(graph, seed=seed + step)
+            incremental.append(run_update(sg_sim, frontiers))
+        result = {
+            'num_objects': num_objects,
+            'num_hydra_nodes': graph.num_nodes(),
+            'num_nodes': len(sg_sim.filtered_graph),
+            'first_update': first,
+            'incremental_update': {stage: float(np.median([t[stage] for t in incremental])) for stage in first} if steps > 0 else None,
+        }
+        result.update(sg_sim.scene_graph_size)
+    return result
+
+
+def main(cfg, sizes, num_frontiers, steps, seed, output_file):
+    results = []
+    for num_objects in sizes:
+        result = benchmark(cfg, num_objects, num_frontiers, steps, seed)
+        results.append(result)
+        for name in ('first_update', 'incremental_update'):
+            if result[name] is None:
+                continue
+            stages = ', '.join(f"{stage} {1000*t:.1f} ms" for stage, t in result[name].items())
+            click.secho(f"{num_objects} objects, {name}: {stages}", fg="green")
+        click.secho(f"{num_objects} objects: {result['num_nodes']} scene graph nodes, prompt {result['chars']} chars, ~{result['tokens']} tokens", fg="yellow")
+
+    if output_file is not None:
+        with open(output_file, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-cf", "--cfg_file", help="cfg file name", default="", type=str, required=True)
+    parser.add_argument("-n", "--num_objects", help="scene sizes to benchmark", nargs="+", default=[100, 1000, 10000], type=int)
+    parser.add_argument("-fr", "--num_frontiers", help="frontiers per update", default=20, type=int)
+    parser.add_argument("-st", "--steps", help="incremental updates timed after the first one", default=5, type=int)
+    parser.add_argument("-s", "--seed", help="random seed of the synthetic scene", default=0, type=int)
+    parser.add_argument("-o", "--output_file", help="optional json file for the results", default=None, type=str)
+    args = parser.parse_args()
+
+    config_path = Path(__file__).resolve().parent.parent / 'cfg' / f'{args.cfg_file}.yaml'
+    cfg = OmegaConf.load(config_path)
+
+    # Only the scene graph is benchmarked: no VLM room labels, no image models
+    cfg.scene_graph_sim.enrich_rooms = False
+    cfg.scene_graph_sim.save_image = False
+    cfg.scene_graph_sim.include_regions = False
+    cfg.scene_graph_sim.key_frame_selection.use_clip_for_images = False
+    cfg.scene_graph_sim.key_frame_selection.use_siglip_for_images = False
+
+    OmegaConf.resolve(cfg)
+    main(cfg, args.num_objects, args.num_frontiers, args.steps, args.seed, args.output_file)
@@ -10,10 +10,12 @@ from graph_eqa.logging.utils import should_skip_experiment, log_experiment_statu
 from graph_eqa.envs.utils import pos_habitat_to_normal, pos_normal_to_habitat
 from graph_eqa.occupancy_mapping.geom import get_scene_bnds, get_cam_intr
 from graph_eqa.envs.habitat import run
+from graph_eqa.envs.mesh_stream import HydraMeshStream
 from graph_eqa.logging.rr_logger import RRLogger
 from graph_eqa.occupancy_mapping.tsdf import TSDFPlanner
 from graph_eqa.utils.data_utils import load_eqa_data, get_instruction_from_eqa_data, get_traj_len_from_poses
 from graph_eqa.utils.hydra_utils import initialize_hydra_pipeline
+from graph_eqa.utils.graph_saver import SceneGraphSaver
 
 
 from graph_eqa.scene_graph.scene_graph_sim import SceneGraphSim
@@ -66,7 +68,9 @@ def main(cfg):
             device=device,)
         pipeline = initialize_hydra_pipeline(cfg.hydra, habitat_data, question_path)
         
-        rr_logger = RRLogger(question_path)
+        rr_logger = RRLogger(question_path, cfg=cfg.logging.get('rerun', None))
+        mesh_stream = HydraMeshStream(**cfg.logging.get('mesh_stream', {}))
+        graph_saver = SceneGraphSaver(question_path, **cfg.logging.get('graph_saving', {}))
 
         # Extract initial pose
         init_pts = init_pose_data[scene_floor]["init_pts"]
@@ -116,6 +120,8 @@ def main(cfg):
             sg_sim=sg_sim,
             save_image=cfg.vlm.use_image,
             segmenter=segmenter,
+            mesh_stream=mesh_stream,
+            graph_saver=graph_saver,
         )
 
         if 'gpt' in cfg.vlm.name.lower():
@@ -210,6 +216,8 @@ def main(cfg):
                         sg_sim=sg_sim,
                         save_image=cfg.vlm.use_image,
                         segmenter=segmenter,
+                        mesh_stream=mesh_stream,
+                        graph_saver=graph_saver,
                     )
                     traj_length += get_traj_len_from_poses(poses)
 
@@ -230,8 +238,14 @@ def main(cfg):
             'traj_length': traj_length
         }
         log_experiment_status(experiment_id, succ, metrics=metrics, filename=results_filename)
+        map_export_cfg = cfg.logging.get('map_export', None)
+        if map_export_cfg is not None and map_export_cfg.get('enabled', False):
+            tsdf_planner.export_map(question_path, binary=map_export_cfg.get('binary', True), chunk_size=map_export_cfg.get('chunk_size', None))
         habitat_data._sim.close(destroy=True)
         pipeline.save()
+        sg_sim.close()
+        graph_saver.close()
+        rr_logger.close()
 
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,85 @@
+from omegaconf import OmegaConf
+import click
+import glob, os
+from pathlib import Path
+import imageio
+import numpy as np
+import torch
+
+from graph_eqa.scene_graph.image_encoders import IMAGE_ENCODER_BACKENDS, build_image_encoder, encode_images, record_validation, topk_agreement, time_encoder
+
+
+def load_frames(frames_path):
+    """Recorded RGB frames from a directory of images or a gif/video."""
+    if os.path.isdir(frames_path):
+        paths = sorted(glob.glob(os.path.join(frames_path, '*.png')) + glob.glob(os.path.join(frames_path, '*.jpg')))
+        frames = [imageio.imread(path) for path in paths]
+    else:
+        frames = list(imageio.mimread(frames_path))
+    return [np.asarray(frame)[..., :3] for frame in frames]
+
+
+def main(cfg, frames_path, prompt, backends, image_size, window, validation_path):
+    kf_cfg = cfg.scene_graph_sim.key_frame_selection
+    if kf_cfg.use_clip_for_images:
+        from transformers import CLIPProcessor as Processor, CLIPModel as Model
+        model_name, padding = "openai/clip-vit-base-patch32", True
+    else:
+        from transformers import AutoProcessor as Processor, AutoModel as Model
+        model_name, padding = "google/siglip-base-patch16-224", "max_length"
+    model = Model.from_pretrained(model_name).eval()
+    processor = Processor.from_pretrained(model_name)
+
+    frames = load_frames(frames_path)
+    pixel_values = processor(images=frames, return_tensors="pt")['pixel_values']
+    text = processor(text=[prompt], padding=padding, return_tensors="pt")
+    with torch.no_grad():
+        text_features = torch.nn.functional.normalize(model.get_text_features(**text), dim=-1)
+
+    def scores(encoder):
+        return (encode_images(encoder, pixel_values) @ text_features.T).squeeze(-1).numpy()
+
+    reference = build_image_encoder(model, 'torch')
+    reference_scores = scores(reference)
+    reference_time = time_encoder(reference, pixel_values)
+    click.secho(f"torch fp32 @native: {1000*reference_time:.1f} ms/frame over {len(frames)} frames", fg="green")
+
+    topk = kf_cfg.topk
+    onnx_dir = kf_cfg.get('onnx_dir', None) or str(Path(__file__).resolve().parent.parent / 'outputs' / 'onnx')
+    for backend in backends:
+        encoder = build_image_encoder(model, backend, image_size=image_size, onnx_dir=onnx_dir, model_name=model_name)
+        backend_scores = scores(encoder)
+        backend_time = time_encoder(encoder, pixel_values)
+        # Key frames are chosen over the frames of one trajectory, so rankings are compared per window
+        agreements = [topk_agreement(reference_scores[i:i+window], backend_scores[i:i+window], topk) for i in range(0, len(frames), window)]
+        click.secho(
+            f"{backend} @{image_size or 'native'}: {1000*backend_time:.1f} ms/frame "
+            f"({reference_time/backend_time:.1f}x), top-{topk} agreement {np.mean(agreements):.2f} "
+            f"(min {np.min(agreements):.2f}), max |score diff| {np.abs(reference_scores-backend_scores).max():.4f}",
+            fg="green" if np.min(agreements) == 1.0 else "yellow")
+        if validation_path is not None:
+            record_validation(validation_path, model_name, backend, image_size, topk, agreements)
+
+    if validation_path is not None:
+        click.secho(f"Recorded agreements in {validation_path}", fg="green")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-cf", "--cfg_file", help="cfg file name", default="", type=str, required=True)
+    parser.add_argument("-f", "--frames", help="directory of recorded frames or a gif", type=str, required=True)
+    parser.add_argument("-p", "--prompt", help="text the frames are ranked against", default="a photo of a room", type=str)
+    parser.add_argument("-b", "--backends", help="backends to compare against torch fp32", nargs="+", default=['int8', 'onnx', 'onnx_int8'], choices=IMAGE_ENCODER_BACKENDS)
+    parser.add_argument("-s", "--image_size", help="input resolution override", default=None, type=int)
+    parser.add_argument("-w", "--window", help="frames per trajectory window", default=20, type=int)
+    parser.add_argument("-o", "--validation_file", help="json the agreements are recorded in, defaults to the cfg's image_backend_validation", default=None, type=str)
+    args = parser.parse_args()
+
+    config_path = Path(__file__).resolve().parent.parent / 'cfg' / f'{args.cfg_file}.yaml'
+    cfg = OmegaConf.load(config_path)
+
+    OmegaConf.resolve(cfg)
+    validation_path = args.validation_file or cfg.scene_graph_sim.key_frame_selection.get('image_backend_validation', None)
+    main(cfg, args.frames, args.prompt, args.backends, args.image_size, args.window, validation_path)
@@ -13,6 +13,7 @@ setup(
         "scikit-image",
         "yacs",
         "networkx",
+        "scipy",
         "SentencePiece",
         "anthropic",
         "google-generativeai"
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from graph_eqa.scene_graph.nms import grid_nms
+
+
+def greedy_nms(positions, scores, threshold):
+    """Brute-force reference: the greedy loop grid_nms replaced."""
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    keep = []
+    for i in order:
+        if all(np.linalg.norm(np.array(positions[i]) - np.array(positions[j])) >= threshold for j in keep):
+            keep.append(i)
+    return keep
+
+
+@pytest.mark.parametrize("dim", [2, 3])
+def test_grid_nms_matches_greedy_on_random_points(dim):
+    rng = np.random.default_rng(dim)
+    for _ in range(100):
+        num_points = int(rng.integers(1, 200))
+        positions = rng.random((num_points, dim)) * rng.uniform(0.5, 20.)
+        # Coarse scores so ties are exercised too
+        scores = rng.integers(0, 10, size=num_points).astype(float)
+        threshold = rng.uniform(0.05, 2.)
+        assert grid_nms(positions, scores, threshold).tolist() == greedy_nms(positions, scores, threshold)
+
+
+def test_grid_nms_matches_greedy_near_the_threshold():
+    rng = np.random.default_rng(0)
+    threshold = 0.1
+    for _ in range(300):
+        # Axis-aligned pairs one or two ulps either side of threshold apart, at random grid origins,
+        # so the cell each point rounds into decides whether the pair is ever compared
+        origin = -rng.random(3) * 10.
+        anchors = origin + rng.integers(1, 100, size=(20, 3)) * threshold
+        axes = np.eye(3)[rng.integers(0, 3, size=20)]
+        distances = rng.choice([np.nextafter(threshold, 0.), threshold - 2e-17, threshold, np.nextafter(threshold, 1.)], size=(20, 1))
+        positions = np.concatenate([origin[None], anchors, anchors + axes * distances])
+        scores = rng.random(len(positions))
+        assert grid_nms(positions, scores, threshold).tolist() == greedy_nms(positions, scores, threshold)
+
+
+def test_grid_nms_suppresses_points_that_round_two_cells_apart():
+    # 0.09999999999999998 apart, but with cells exactly threshold wide they land in cells 98 and 100
+    positions = np.array([[0., -9.489436749377653], [0., 0.41056325062234655], [0., 0.5105632506223465]])
+    scores = np.array([0., 2., 1.])
+    assert grid_nms(positions, scores, 0.1).tolist() == greedy_nms(positions, scores, 0.1) == [1, 0]
+
+
+def test_grid_nms_empty():
+    assert len(grid_nms(np.zeros((0, 3)), np.zeros(0), 0.5)) == 0
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from graph_eqa.occupancy_mapping.geom import meshwrite_binary, meshwrite_stream, pcwrite, pcwrite_binary
+
+PLY_TYPES = {"float": "<f4", "uchar": "u1", "int": "<i4"}
+
+
+def read_ply(filename):
+    """Elements of a binary little-endian PLY as structured arrays, faces as (F, 3) indices."""
+    with open(filename, "rb") as f:
+        assert f.readline() == b"ply\n"
+        assert f.readline() == b"format binary_little_endian 1.0\n"
+        elements = []
+        for line in iter(f.readline, b"end_header\n"):
+            fields = line.decode("ascii").split()
+            if fields[0] == "element":
+                elements.append((fields[1], int(fields[2]), []))
+            elif fields[1] == "list":
+                # Faces are written as a uchar count followed by three int indices
+                elements[-1][2].extend([("n", PLY_TYPES[fields[2]]), (fields[4], PLY_TYPES[fields[3]], (3,))])
+            else:
+                elements[-1][2].append((fields[2], PLY_TYPES[fields[1]]))
+        data = {name: np.fromfile(f, dtype=np.dtype(dtype), count=count) for name, count, dtype in elements}
+        assert f.read() == b""
+    return data
+
+
+def random_mesh(rng, num_verts=50, num_faces=80):
+    verts = rng.normal(size=(num_verts, 3))
+    norms = rng.normal(size=(num_verts, 3))
+    colors = rng.integers(0, 256, size=(num_verts, 3)).astype(np.uint8)
+    faces = rng.integers(0, num_verts, size=(num_faces, 3))
+    return verts, faces, norms, colors
+
+
+def check_mesh(data, verts, faces, norms, colors):
+    vertex, face = data["vertex"], data["face"]
+    np.testing.assert_allclose(np.stack([vertex["x"], vertex["y"], vertex["z"]], axis=1), verts, rtol=1e-6)
+    np.testing.assert_allclose(np.stack([vertex["nx"], vertex["ny"], vertex["nz"]], axis=1), norms, rtol=1e-6)
+    np.testing.assert_array_equal(np.stack([vertex["red"], vertex["green"], vertex["blue"]], axis=1), colors)
+    np.testing.assert_array_equal(face["n"], 3)
+    np.testing.assert_array_equal(face["vertex_index"], faces)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7, 1000])
+def test_meshwrite_binary_round_trip(tmp_path, chunk_size):
+    mesh = random_mesh(np.random.default_rng(0))
+    meshwrite_binary(tmp_path / "mesh.ply", *mesh, chunk_size=chunk_size)
+    check_mesh(read_ply(tmp_path / "mesh.ply"), *mesh)
+
+
+def test_meshwrite_stream_round_trip(tmp_path):
+    verts, faces, norms, colors = random_mesh(np.random.default_rng(1))
+    vertex_chunks = [(verts[i:i + 20], norms[i:i + 20], colors[i:i + 20]) for i in range(0, len(verts), 20)]
+    face_chunks = [faces[:5], faces[5:5], faces[5:]]
+    assert meshwrite_stream(tmp_path / "mesh.ply", vertex_chunks, face_chunks) == (len(verts), len(faces))
+    check_mesh(read_ply(tmp_path / "mesh.ply"), verts, faces, norms, colors)
+
+
+def test_pcwrite_binary_matches_ascii(tmp_path):
+    rng = np.random.default_rng(2)
+    xyzrgb = np.hstack([rng.normal(size=(30, 3)), rng.integers(0, 256, size=(30, 3))])
+    pcwrite_binary(tmp_path / "pc.ply", xyzrgb)
+    pcwrite(tmp_path / "pc_ascii.ply", xyzrgb)
+
+    vertex = read_ply(tmp_path / "pc.ply")["vertex"]
+    ascii_rows = np.loadtxt(tmp_path / "pc_ascii.ply", skiprows=10)
+    np.testing.assert_allclose(np.stack([vertex[name] for name in vertex.dtype.names], axis=1), ascii_rows, atol=1e-5)
@@ -0,0 +1,88 @@
+from omegaconf import OmegaConf
+import json, os
+from pathlib import Path
+import numpy as np
+import pytest
+
+# SceneGraphSim creates an OpenAI client at import time, room enrichment is disabled below so no request is made
+os.environ.setdefault("OPENAI_API_KEY", "test")
+from graph_eqa.scene_graph.scene_graph_sim import SceneGraphSim
+from graph_eqa.scene_graph.serialization import estimate_tokens
+from graph_eqa.utils.synthetic_scene import (OBJECTS_LAYER, BoundingBox, SyntheticPipeline, make_synthetic_scene,
+                                             random_frontiers, step_synthetic_scene)
+
+
+def load_cfg(incremental_update, scene_graph_format):
+    config_path = Path(__file__).resolve().parent.parent / 'cfg' / 'grapheqa_habitat.yaml'
+    cfg = OmegaConf.load(config_path)
+    # Only the scene graph is compared: no VLM room labels, no image models
+    cfg.scene_graph_sim.enrich_rooms = False
+    cfg.scene_graph_sim.save_image = False
+    cfg.scene_graph_sim.key_frame_selection.use_clip_for_images = False
+    cfg.scene_graph_sim.key_frame_selection.use_siglip_for_images = False
+    cfg.scene_graph_sim.incremental_update = incremental_update
+    cfg.scene_graph_sim.scene_graph_format = scene_graph_format
+    OmegaConf.resolve(cfg)
+    return cfg
+
+
+def mutate_scene(graph, rng, step):
+    """A perception step that also adds, removes and re-parents objects."""
+    step_synthetic_scene(graph, seed=step)
+    objects = [node.id.value for node in graph.nodes if node.id.category == 'O']
+    places = [node.id.value for node in graph.nodes if node.id.category == 'p']
+    graph.remove_node(int(rng.choice(objects)))
+    for i in range(3):
+        place = int(rng.choice(places))
+        center = graph.get_node(place).attributes.position + rng.normal(scale=0.5, size=3)
+        obj = graph.add_node('O', 10000 + 3*step + i, OBJECTS_LAYER, center, name='chair', semantic_label=i,
+                             bounding_box=BoundingBox(center, 0.2 + rng.random(3), np.eye(3)))
+        graph.add_edge(place, obj)
+    # Re-parent an object by re-adding it under another place
+    obj = int(rng.choice(objects))
+    if graph.has_node(obj):
+        node = graph.get_node(obj)
+        graph.remove_node(obj)
+        place = int(rng.choice(places))
+        obj = graph.add_node(node.id.category, node.id.category_id, OBJECTS_LAYER, node.attributes.position,
+                             name=node.attributes.name, semantic_label=node.attributes.semantic_label,
+                             bounding_box=node.attributes.bounding_box)
+        graph.add_edge(place, obj)
+
+
+@pytest.mark.parametrize("scene_graph_format", ['node_link', 'compact'])
+@pytest.mark.parametrize("include_regions", [False, True])
+def test_incremental_prompt_matches_full_rebuild(tmp_path, scene_graph_format, include_regions):
+    graph = make_synthetic_scene(200, seed=0)
+    sims = []
+    for incremental_update in (False, True):
+        cfg = load_cfg(incremental_update, scene_graph_format)
+        cfg.scene_graph_sim.include_regions = include_regions
+        output_path = tmp_path / str(incremental_update)
+        output_path.mkdir()
+        sims.append(SceneGraphSim(cfg, output_path, SyntheticPipeline(graph)))
+
+    rng = np.random.default_rng(0)
+    for step in range(6):
+        frontiers = random_frontiers(graph, 10, seed=step)
+        for sg_sim in sims:
+            sg_sim.update(frontier_nodes=frontiers)
+        full, incremental = sims
+        assert incremental.scene_graph_str == full.scene_graph_str
+        assert incremental.object_node_ids == full.object_node_ids
+        assert incremental.room_node_ids == full.room_node_ids
+        mutate_scene(graph, rng, step)
+
+
+@pytest.mark.parametrize("prompt_token_budget", [None, 2000])
+def test_prompt_matches_networkx_export(tmp_path, prompt_token_budget):
+    nx = pytest.importorskip("networkx")
+    graph = make_synthetic_scene(200, seed=0)
+    cfg = load_cfg(True, 'node_link')
+    cfg.scene_graph_sim.prompt_token_budget = prompt_token_budget
+    sg_sim = SceneGraphSim(cfg, tmp_path, SyntheticPipeline(graph))
+    sg_sim.update(frontier_nodes=random_frontiers(graph, 10, seed=0))
+    # The prompt is written from the store's columns, the NetworkX graph is only built here for comparison
+    assert sg_sim.scene_graph_str == json.dumps(nx.node_link_data(sg_sim.get_relevant_subgraph().to_networkx(), edges='edges'))
+    if prompt_token_budget is not None:
+        assert estimate_tokens(sg_sim.scene_graph_str) <= prompt_token_budget